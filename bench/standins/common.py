@@ -0,0 +1,43 @@
+import os
+import sys
+import subprocess
+from re import fullmatch
+from pathlib import Path
+from shutil import copy2
+
+# the real ffmpeg, set by bench/throughput.py
+FFMPEG = os.environ.get("AESIMP_BENCH_FFMPEG", "ffmpeg")
+
+def ffmpeg(args: list[str]):
+    result = subprocess.run([FFMPEG, "-v", "error", "-y"] + args, stdout=subprocess.DEVNULL)
+    if result.returncode != 0:
+        sys.exit(result.returncode)
+
+# input files of -i (folder or single file), sorted like the real tools
+def input_files(path: Path) -> list[Path]:
+    if path.is_file():
+        return [path]
+    return sorted(p for p in path.iterdir() if p.is_file())
+
+# first number if the files are a sequence 00000001.png, 00000002.png, ... else None
+def sequence_start(files: list[Path]) -> int | None:
+    if not files or any(f.suffix != files[0].suffix or not fullmatch(r"\d{8}", f.stem) for f in files):
+        return None
+    start = int(files[0].stem)
+    if [int(f.stem) for f in files] != list(range(start, start + len(files))):
+        return None
+    return start
+
+# ffmpeg reads image sequences only with numbered names, other names are linked into a numbered folder
+def as_sequence(files: list[Path], folder: Path) -> tuple[Path, int]:
+    start = sequence_start(files)
+    if start is not None:
+        return files[0].parent / f"%08d{files[0].suffix}", start
+    folder.mkdir(parents=True, exist_ok=True)
+    for i, f in enumerate(files, start=1):
+        target = folder / f"{i:08d}{f.suffix}"
+        try:
+            os.link(f, target)
+        except OSError:
+            copy2(f, target)
+    return folder / f"%08d{files[0].suffix}", 1
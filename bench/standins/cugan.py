@@ -0,0 +1,47 @@
+import argparse
+from pathlib import Path
+from common import ffmpeg, input_files, sequence_start
+
+# ------------------------------------------------------------------
+# Stand-in for realcugan-ncnn-vulkan (benchmarks without a GPU)
+#
+# same command line: -i folder/file, -o folder/file, -s scale, -n noise, -f format
+# tile size, threads, gpu and model are ignored
+# the frames are scaled with ffmpeg (lanczos, denoise for -n > 0),
+# so size, names and format of the output are the same as with cugan
+# and the work per frame is always the same
+# ------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-i", required=True)
+    parser.add_argument("-o", required=True)
+    parser.add_argument("-s", type=int, default=2)
+    parser.add_argument("-n", type=int, default=-1)
+    parser.add_argument("-f", default="png") # like cugan
+    args, _ = parser.parse_known_args()
+
+    vf = f"scale=iw*{args.s}:ih*{args.s}:flags=lanczos"
+    if args.n > 0:
+        vf = f"hqdn3d={args.n},{vf}"
+
+    in_path, out_path = Path(args.i), Path(args.o)
+    files = input_files(in_path)
+    if in_path.is_file(): # single image, -o is the output file
+        ffmpeg(["-i", str(in_path), "-vf", vf, "-frames:v", "1", "-update", "1", str(out_path)])
+        return
+
+    out_path.mkdir(parents=True, exist_ok=True)
+    start = sequence_start(files)
+    if start is not None: # frames of a chunk: one ffmpeg call for all
+        ffmpeg(["-start_number", str(start), "-i", str(in_path / f"%08d{files[0].suffix}"), "-vf", vf,
+                "-start_number", str(start), str(out_path / f"%08d.{args.f}")])
+        return
+
+    # other names (batch of images): one call per image, <stem>.<-f> like cugan
+    for f in files:
+        ffmpeg(["-i", str(f), "-vf", vf, "-frames:v", "1", "-update", "1", str(out_path / f"{f.stem}.{args.f}")])
+
+
+if __name__ == "__main__":
+    main()
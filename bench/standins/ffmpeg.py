@@ -0,0 +1,27 @@
+import os
+import sys
+import json
+import subprocess
+from common import FFMPEG
+
+# ------------------------------------------------------------------
+# ffmpeg for benchmarks
+#
+# the encoder settings in the tools are "####" placeholders,
+# they are replaced by AESIMP_BENCH_ENCODER (json list), everything else goes to the real ffmpeg
+# ------------------------------------------------------------------
+
+ENCODER = json.loads(os.environ.get("AESIMP_BENCH_ENCODER", "null")) or ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p"]
+
+def main():
+    args = []
+    for arg in sys.argv[1:]:
+        args += ENCODER if arg == "####" else [arg]
+
+    if os.name == "nt":
+        sys.exit(subprocess.call([FFMPEG] + args))
+    os.execv(FFMPEG, [FFMPEG] + args) # same process, so stopping the job stops ffmpeg
+
+
+if __name__ == "__main__":
+    main()
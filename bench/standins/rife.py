@@ -0,0 +1,37 @@
+import argparse
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from common import ffmpeg, input_files, as_sequence
+
+# ------------------------------------------------------------------
+# Stand-in for rife-ncnn-vulkan (benchmarks without a GPU)
+#
+# same command line: -i folder, -o folder, -n frames, -f output pattern (e.g. %08d.png)
+# tile size, threads, gpu and model are ignored
+# the new frames are blended with the ffmpeg framerate filter,
+# the output is numbered 1 ... -n with the -f pattern like with rife
+# ------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-i", required=True)
+    parser.add_argument("-o", required=True)
+    parser.add_argument("-n", type=int, default=0)
+    parser.add_argument("-f", default="%08d.png") # like rife, a pattern and not a format
+    args, _ = parser.parse_known_args()
+
+    files = input_files(Path(args.i))
+    num_out = args.n or len(files) * 2 # rife default: twice the frames
+    out_dir = Path(args.o)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with TemporaryDirectory(prefix="rife-", dir=out_dir.parent) as tmp:
+        pattern, start = as_sequence(files, Path(tmp) / "frames")
+        # the input as 1 second long video, so <num_out> frames per second are exactly -n frames
+        ffmpeg(["-framerate", str(len(files)), "-start_number", str(start), "-i", str(pattern),
+                "-vf", f"framerate=fps={num_out},tpad=stop_mode=clone:stop={num_out}", "-frames:v", str(num_out),
+                str(out_dir / args.f)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+from os import environ
+from pathlib import Path
+from statistics import median
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+from registry import PLUGINS
+
+
+# ------------------------------------------------------------------
+# Startup benchmark
+#
+# every SendTo click starts a new process, so the import time of
+# run.py + the plugin of the mode is measured in a fresh python each time
+#
+#   python bench/startup.py --out startup.json
+#   python bench/startup.py --baseline startup.json   (exit code 1 if slower)
+# ------------------------------------------------------------------
+
+# what run.main does before the plugin starts
+MEASURE = """
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+import run
+from registry import find_plugin
+from importlib import import_module
+import_module(find_plugin({mode!r})["module"])
+print(time.perf_counter() - start)
+"""
+
+def measure(mode: str, env: dict, importtime: bool = False) -> tuple[float | None, str]:
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", MEASURE.format(src=str(SRC_DIR), mode=mode)]
+    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+# slowest modules from -X importtime (cumulative microseconds)
+def slowest_imports(stderr: str, count: int = 10) -> list[tuple[int, str]]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time per mode")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", nargs="*", default=sorted(PLUGINS))
+    parser.add_argument("--out", help="save the results as json")
+    parser.add_argument("--baseline", help="compare with a saved json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown (0.25 = 25 %%)")
+    parser.add_argument("--detail", action="store_true", help="show the slowest imports per mode")
+    args = parser.parse_args()
+
+    env = dict(environ)
+    tmp = tempfile.mkdtemp(prefix="aesimp-bench-")
+    env.setdefault("LocalAppData", tmp) # run.py and helper need them, also on linux
+    env.setdefault("APPDATA", tmp)
+
+    results = {}
+    for mode in args.modes:
+        times = []
+        error = None
+        for _ in range(args.runs):
+            seconds, error = measure(mode, env)
+            if seconds is None:
+                break
+            times.append(seconds)
+        if not times:
+            print(f"{mode:32} failed: {error}")
+            results[mode] = None
+            continue
+        results[mode] = median(times)
+        print(f"{mode:32} {results[mode] * 1000:8.1f} ms")
+
+        if args.detail:
+            _, stderr = measure(mode, env, importtime=True)
+            for cumulative, name in slowest_imports(stderr):
+                print(" "*4, f"{cumulative / 1000:8.1f} ms  {name}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({"python": sys.version.split()[0], "modes": results}, indent=4), encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["modes"]
+        slower = []
+        for mode, seconds in results.items():
+            before = baseline.get(mode)
+            # a few ms are noise, only real slowdowns count
+            if seconds is not None and before and seconds > before * (1 + args.tolerance) + 0.005:
+                slower.append(f"{mode}: {before * 1000:.1f} ms -> {seconds * 1000:.1f} ms")
+        if slower:
+            print("\nSlower than the baseline:")
+            for line in slower:
+                print(" "*4, line)
+            sys.exit(1)
+        print("\nNo mode is slower than the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+from os import environ
+from pathlib import Path
+from shutil import which, rmtree
+from statistics import median
+from threading import Thread, Event
+from time import perf_counter
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+STANDIN_DIR = BENCH_DIR / "standins"
+
+
+# ------------------------------------------------------------------
+# Throughput benchmark
+#
+# synthetic videos from ffmpeg lavfi go through the start() of the plugins,
+# cugan and rife are replaced by deterministic CPU stand-ins (bench/standins),
+# so the results only change if the code changes and no GPU is needed
+#
+#   python bench/throughput.py --out throughput.json
+#   python bench/throughput.py --baseline throughput.json   (exit code 1 if slower)
+#
+# every case runs in a fresh python with an own install folder (empty cache, no calibration)
+# ------------------------------------------------------------------
+
+# size, fps, seconds: the generated video
+# dup: part of the frames which repeat the frame before (0.5 = animated on twos)
+# answers: what the tool asks for (see helper.intput), settings: extra settings for this case
+CASES = [
+    {"name": "converter-720p30", "mode": "converter", "size": (1280, 720), "fps": 30, "seconds": 8, "dup": 0,
+     "settings": {"segment_seconds": 2}},
+    {"name": "downscale-1080p60", "mode": "downscale", "size": (1920, 1080), "fps": 60, "seconds": 3, "dup": 0, "answers": [23, 720]},
+    {"name": "upscale-360p24-twos", "mode": "upscale", "size": (640, 360), "fps": 24, "seconds": 4, "dup": 0.5},
+    {"name": "upscale-480p30", "mode": "upscale", "size": (854, 480), "fps": 30, "seconds": 2, "dup": 0},
+    {"name": "interpolate-360p24-x2", "mode": "interpolate", "size": (640, 360), "fps": 24, "seconds": 4, "dup": 0, "answers": [0, 2]},
+    {"name": "interpolate-360p30-60fps", "mode": "interpolate", "size": (640, 360), "fps": 30, "seconds": 4, "dup": 0, "answers": [60]},
+    {"name": "chain-360p24-threes", "mode": "upscale+interpolate+converter", "size": (640, 360), "fps": 24, "seconds": 3, "dup": 2 / 3,
+     "answers": [60]},
+]
+
+# settings of every case, scratch_dir is added per case
+SETTINGS = {"chunk_seconds": 1, "timing_reports": True, "skip_up_to_date": False}
+
+STANDINS = {"ffmpeg": "ffmpeg.py", "cugan": "cugan.py", "rife-ncnn-vulkan": "rife.py"}
+
+
+def generate_input(ffmpeg_path: str, case: dict, target: Path):
+    width, height = case["size"]
+    fps = case["fps"]
+    # fewer source frames, the fps filter repeats them up to <fps>
+    source_rate = max(1, round(fps * (1 - case["dup"])))
+    cmd = [
+        ffmpeg_path, "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={source_rate}:duration={case['seconds']}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={case['seconds']}",
+        "-vf", f"fps={fps}", "-c:v", "libx264", "-preset", "veryfast", "-qp", "0", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest", str(target)
+    ]
+    subprocess.run(cmd, check=True)
+
+# small launchers in <bin_dir> which run the stand-ins with this python
+def create_launchers(bin_dir: Path) -> dict:
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    launchers = {}
+    for name, script in STANDINS.items():
+        if os.name == "nt":
+            launcher = bin_dir / f"{name}.cmd"
+            launcher.write_text(f'@"{sys.executable}" "{STANDIN_DIR / script}" %*\n', encoding="utf-8")
+        else:
+            launcher = bin_dir / name
+            launcher.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{STANDIN_DIR / script}" "$@"\n', encoding="utf-8")
+            launcher.chmod(0o755)
+        launchers[name] = str(launcher)
+    return launchers
+
+def tree_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.stat(os.path.join(root, f)).st_size
+            except OSError: # deleted in the meantime
+                pass
+    return total
+
+# largest memory of this python or of one of the processes it started (ffmpeg, stand-ins)
+def peak_rss() -> int | None:
+    try:
+        import resource
+    except ImportError: # windows
+        return None
+    unit = 1 if sys.platform == "darwin" else 1024 # bytes on macos, KB on linux
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * unit
+
+
+# ------------------------------------------------------------------
+# One case (in the fresh python)
+# ------------------------------------------------------------------
+
+def run_case(spec: dict) -> dict:
+    sys.path.insert(0, str(SRC_DIR))
+    from importlib import import_module
+    from helper import write_cache, app_identity, set_answers, get_file_info
+    from registry import find_plugin
+    from timing import REPORT_DIR
+
+    # the tools are found without searching or installing
+    for name, exe_path in spec["apps"].items():
+        write_cache(name, app_identity(exe_path), namespace="apps")
+
+    source = Path(spec["source"])
+    frames = get_file_info(source)["frames"]
+    scratch_dir = Path(spec["scratch_dir"])
+    scratch_dir.mkdir(parents=True, exist_ok=True)
+
+    peak_scratch = [0]
+    done = Event()
+    def sample_scratch():
+        while not done.wait(0.05):
+            peak_scratch[0] = max(peak_scratch[0], tree_size(scratch_dir))
+    sampler = Thread(target=sample_scratch, daemon=True)
+    sampler.start()
+
+    set_answers(spec["answers"])
+    start = perf_counter()
+    try:
+        import_module(find_plugin(spec["mode"])["module"]).start(spec["mode"], [str(source)])
+    finally:
+        seconds = perf_counter() - start
+        done.set()
+        sampler.join()
+
+    # run_chunked writes one timing report per video
+    stages = {}
+    for report_file in REPORT_DIR.glob("*.json"):
+        for name, stage in json.loads(report_file.read_text(encoding="utf-8"))["stages"].items():
+            s = stages.setdefault(name, {"seconds": 0.0, "frames": 0, "bytes": 0})
+            for key in s:
+                s[key] += stage[key]
+    for s in stages.values():
+        s["frames_per_second"] = s["frames"] / s["seconds"] if s["seconds"] > 0 else None
+
+    return {
+        "frames": frames,
+        "seconds": seconds,
+        "frames_per_second": frames / seconds,
+        "stages": stages,
+        "peak_scratch_bytes": peak_scratch[0],
+        "peak_rss_bytes": peak_rss(),
+    }
+
+def measure(case: dict, work_dir: Path, source: Path, apps: dict, ffmpeg_path: str) -> dict:
+    install_dir = work_dir / "appdata"
+    rmtree(install_dir, ignore_errors=True)
+    (install_dir / "aesimp-tools").mkdir(parents=True)
+    scratch_dir = work_dir / "scratch"
+    rmtree(scratch_dir, ignore_errors=True)
+
+    settings = {**SETTINGS, "scratch_dir": str(scratch_dir), **case.get("settings", {})}
+    (install_dir / "aesimp-tools" / "settings.json").write_text(json.dumps(settings), encoding="utf-8")
+
+    env = dict(environ)
+    env["LocalAppData"] = str(install_dir)
+    env["APPDATA"] = str(install_dir)
+    env["AESIMP_BENCH_FFMPEG"] = ffmpeg_path
+
+    spec = {"mode": case["mode"], "answers": case.get("answers", []), "source": str(source),
+            "scratch_dir": str(scratch_dir), "apps": apps}
+    result = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--case", json.dumps(spec)],
+                            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)
+    if result.returncode != 0:
+        lines = (result.stderr.strip() or result.stdout.strip() or "failed").splitlines()
+        raise Exception(lines[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+# median of the runs, the peaks are the highest of all runs
+def combine(runs: list[dict]) -> dict:
+    result = dict(min(runs, key=lambda r: abs(r["seconds"] - median(x["seconds"] for x in runs))))
+    result["runs"] = len(runs)
+    result["peak_scratch_bytes"] = max(r["peak_scratch_bytes"] for r in runs)
+    rss = [r["peak_rss_bytes"] for r in runs if r["peak_rss_bytes"] is not None]
+    result["peak_rss_bytes"] = max(rss) if rss else None
+    return result
+
+# slowdowns and more disk / memory than in the baseline
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    worse = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not result or not before:
+            continue
+        if result["frames_per_second"] < before["frames_per_second"] * (1 - tolerance):
+            worse.append(f"{name}: {before['frames_per_second']:.1f} -> {result['frames_per_second']:.1f} frames/s")
+        for key, label in (("peak_scratch_bytes", "scratch"), ("peak_rss_bytes", "memory")):
+            if result.get(key) and before.get(key) and result[key] > before[key] * (1 + tolerance) + 1024 ** 2:
+                worse.append(f"{name}: {label} {before[key] / 1024 ** 2:.0f} MB -> {result[key] / 1024 ** 2:.0f} MB")
+    return worse
+
+def main():
+    parser = argparse.ArgumentParser(description="Frames/s, scratch space and memory per tool")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--cases", nargs="*", default=[c["name"] for c in CASES])
+    parser.add_argument("--ffmpeg", default=which("ffmpeg"), help="real ffmpeg (Default: from PATH)")
+    parser.add_argument("--ffprobe", default=which("ffprobe"), help="real ffprobe (Default: from PATH)")
+    parser.add_argument("--out", help="save the results as json")
+    parser.add_argument("--baseline", help="compare with a saved json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown (0.2 = 20 %%)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated videos and outputs")
+    parser.add_argument("--case", help=argparse.SUPPRESS) # internal: run one case in this process
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    if not args.ffmpeg or not args.ffprobe:
+        sys.exit("ffmpeg and ffprobe are needed, add them to PATH or use --ffmpeg / --ffprobe")
+
+    cases = [c for c in CASES if c["name"] in args.cases]
+    work_dir = Path(tempfile.mkdtemp(prefix="aesimp-throughput-"))
+    launchers = create_launchers(work_dir / "bin")
+    apps = {"ffmpeg": launchers["ffmpeg"], "ffprobe": args.ffprobe,
+            "cugan": launchers["cugan"], "rife-ncnn-vulkan": launchers["rife-ncnn-vulkan"]}
+
+    results = {}
+    try:
+        for case in cases:
+            case_dir = work_dir / case["name"]
+            case_dir.mkdir()
+            source = case_dir / "input.mp4"
+            generate_input(args.ffmpeg, case, source)
+            runs = []
+            try:
+                for _ in range(args.runs):
+                    runs.append(measure(case, case_dir, source, apps, args.ffmpeg))
+            except Exception as e:
+                print(f"{case['name']:28} failed: {e}")
+                results[case["name"]] = None
+                continue
+
+            result = results[case["name"]] = combine(runs)
+            rss = f"{result['peak_rss_bytes'] / 1024 ** 2:6.0f} MB" if result["peak_rss_bytes"] else "     - MB"
+            print(f"{case['name']:28} {result['frames_per_second']:8.1f} frames/s"
+                  f"  scratch {result['peak_scratch_bytes'] / 1024 ** 2:6.0f} MB  memory {rss}")
+            for name, stage in result["stages"].items():
+                if stage["frames_per_second"]:
+                    print(" "*4, f"{name:8} {stage['frames_per_second']:8.1f} frames/s ({stage['seconds']:.1f}s)")
+    finally:
+        if args.keep:
+            print(f"\nFiles: {work_dir}")
+        else:
+            rmtree(work_dir, ignore_errors=True)
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({"python": sys.version.split()[0], "cases": results}, indent=4), encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["cases"]
+        worse = compare(results, baseline, args.tolerance)
+        if worse:
+            print("\nWorse than the baseline:")
+            for line in worse:
+                print(" "*4, line)
+            sys.exit(1)
+        print("\nNo case is worse than the baseline")
+
+
+if __name__ == "__main__":
+    main()
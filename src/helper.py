@@ -1,11 +1,17 @@
 from os.path import join
 from os import makedirs, getenv
 import json
-import io, zipfile
 from pathlib import Path
-import mimetypes
 from re import search, compile
 import subprocess
+import sqlite3
+import os, signal, atexit
+from time import time, perf_counter
+from shutil import which
+from fractions import Fraction
+from threading import Lock, Thread, get_ident, local
+from hashlib import blake2b
+from concurrent.futures import ThreadPoolExecutor
 
 
 # ------------------------------------------------------------------
@@ -15,35 +21,117 @@ SERVER_URL = "https://aesimp.com" # my website, my server, https encryption
 INSTALL_DIR = Path(getenv("LocalAppData")) / "aesimp-tools"
 DEPENDENCIES_DIR = INSTALL_DIR / "dependencies" # for external apps like ffmpeg, Real-CUGAN, rife-ncnn-vulkan, etc.
 CACHE_DIR = INSTALL_DIR / "cache" # can be deleted anytime
-makedirs(CACHE_DIR, exist_ok=True)
+SETTINGS_FILE = INSTALL_DIR / "settings.json" # optional, user settings (e.g. chunk size)
+
+
+# ------------------------------------------------------------------
+# Settings
+# ------------------------------------------------------------------
+
+_settings = None
+
+# read a value from settings.json, file is optional
+def get_setting(name: str, default=None):
+    global _settings
+    if _settings is None:
+        try:
+            with SETTINGS_FILE.open("r", encoding="utf-8") as f:
+                _settings = json.load(f)
+        except Exception:
+            _settings = {}
+    return _settings.get(name, default)
 
 
 # ------------------------------------------------------------------
 # Cache
 # ------------------------------------------------------------------
 
-def write_cache(cache_name: str, value: str = None, suffix: str = "cache"):
-    if not value:
+# one SQLite file for everything (tool paths, probe results, job manifests, ...)
+# values are stored as json, sorted by namespace
+# SQLite handles the locking, so several processes can use the cache at the same time
+CACHE_DB = CACHE_DIR / "cache.db"
+CACHE_LIMITS = {"probe": 5000} # max entries per namespace, the least recently used are deleted
+
+_cache_local = local() # sqlite connections can't be shared between threads
+
+def _cache_db():
+    conn = getattr(_cache_local, "conn", None)
+    if conn is None:
+        makedirs(CACHE_DIR, exist_ok=True)
+        conn = sqlite3.connect(str(CACHE_DB), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                accessed REAL NOT NULL,
+                expires REAL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        _cache_local.conn = conn
+    return conn
+
+# ttl: seconds until the entry expires, None = never
+def write_cache(key: str, value, namespace: str = "cache", ttl: float = None):
+    if value is None:
         return
-    cache_file = CACHE_DIR / f"{cache_name}.{suffix}"
+    now = time()
     try:
-        with cache_file.open("w", encoding="utf-8") as f:
-            f.write(value.strip())
-    except:
+        conn = _cache_db()
+        with conn: # one transaction
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, accessed, expires) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now, now + ttl if ttl else None)
+            )
+            limit = CACHE_LIMITS.get(namespace)
+            if limit:
+                conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key NOT IN "
+                    "(SELECT key FROM cache WHERE namespace = ? ORDER BY accessed DESC LIMIT ?)",
+                    (namespace, namespace, limit)
+                )
+    except Exception:
         pass
 
-def get_cache(cache_name: str, suffix: str = "cache") -> str | None:
-    cache_file = CACHE_DIR / f"{cache_name}.{suffix}"
-    if cache_file.is_file():
-        with cache_file.open("r", encoding="utf-8") as f:
-            data = f.read().strip()
-        return data or None
-    return None
+def get_cache(key: str, namespace: str = "cache"):
+    now = time()
+    try:
+        conn = _cache_db()
+        row = conn.execute(
+            "SELECT value, accessed, expires FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, accessed, expires = row
+        if expires is not None and expires < now:
+            delete_cache(key, namespace)
+            return None
+        if now - accessed > 3600: # don't write on every read
+            with conn:
+                conn.execute("UPDATE cache SET accessed = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+        return json.loads(value)
+    except Exception:
+        return None
 
-def delete_cache(cache_name: str, suffix: str = "cache"):
-    cache_file = CACHE_DIR / f"{cache_name}.{suffix}"
-    if cache_file.is_file():
-        cache_file.unlink()
+def delete_cache(key: str, namespace: str = "cache"):
+    try:
+        conn = _cache_db()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+    except Exception:
+        pass
+
+# all entries of a namespace as {key: value}
+def list_cache(namespace: str) -> dict:
+    try:
+        rows = _cache_db().execute(
+            "SELECT key, value FROM cache WHERE namespace = ? AND (expires IS NULL OR expires >= ?)", (namespace, time())
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+    except Exception:
+        return {}
 
 
 # ------------------------------------------------------------------
@@ -56,8 +144,108 @@ def extract_num(f: str | Path):
     match = search(r"(\d+)(?!.*\d)", search_str)  # last number in string
     return int(match.group(1)) if match else -1
 
+# ------------------------------------------------------------------
+# Frame sequences
+#
+# numbered frames in a folder (e.g. 00000001.png), frames are addressed by number,
+# so big folders don't have to be listed and sorted again and again
+# ------------------------------------------------------------------
+
+class FrameSequence:
+    # pattern: printf pattern of the file names (as for ffmpeg), None = irregular names (see names)
+    # start: number of the first file, count: number of frames
+    def __init__(self, folder: Path, ext: str = "png", count: int = 0, start: int = 1, pattern: str = "%08d", names: list[str] = None):
+        self.folder = Path(folder)
+        self.ext = ext
+        self.count = count
+        self.start = start
+        self.pattern = pattern
+        self.names = names
+
+    # one os.scandir pass, the numbers only have to be sorted if the names are irregular
+    @classmethod
+    def scan(cls, folder: Path, ext: str = "png") -> "FrameSequence":
+        suffix = f".{ext}"
+        stems = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(suffix) and entry.is_file():
+                    stems.append(entry.name[:-len(suffix)])
+        if not stems:
+            return cls(folder, ext)
+
+        width = len(stems[0])
+        if all(stem.isdigit() and len(stem) == width for stem in stems):
+            numbers = [int(stem) for stem in stems]
+            start = min(numbers)
+            if max(numbers) - start + 1 == len(numbers): # no gaps
+                return cls(folder, ext, len(numbers), start, f"%0{width}d")
+
+        names = sorted((stem + suffix for stem in stems), key=extract_num)
+        return cls(folder, ext, len(names), pattern=None, names=names)
+
+    def __len__(self) -> int:
+        return self.count
+
+    # path of frame <num>, the first frame is 1
+    def path(self, num: int) -> Path:
+        if self.pattern is None:
+            return self.folder / self.names[num - 1]
+        return self.folder / f"{self.pattern % (self.start + num - 1)}.{self.ext}"
+
+    # input / output for ffmpeg, e.g. folder/%08d.png (with -start_number)
+    def ffmpeg_pattern(self) -> str:
+        if self.pattern is None:
+            raise Exception(f"The frames in <{self.folder}> are not numbered")
+        return str(self.folder / f"{self.pattern}.{self.ext}")
+
+    # delete all frames after <keep>
+    def trim(self, keep: int):
+        for num in range(keep + 1, self.count + 1):
+            self.path(num).unlink(missing_ok=True)
+        self.count = min(self.count, keep)
+        if self.names is not None:
+            self.names = self.names[:self.count]
+
+    # numbers of the frames which don't exist
+    def missing(self) -> list[int]:
+        return [num for num in range(1, self.count + 1) if not self.path(num).exists()]
+
+# identity of a file: path, size, mtime and a hash of the first and last MB
+# (a full hash of a large video would take too long)
+def file_identity(path: Path) -> dict:
+    stat = path.stat()
+    h = blake2b(digest_size=16)
+    with path.open("rb") as f:
+        h.update(f.read(1024 * 1024))
+        if stat.st_size > 2 * 1024 * 1024:
+            f.seek(-1024 * 1024, 2)
+            h.update(f.read())
+    return {
+        "path": str(path.resolve()),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "hash": h.hexdigest(),
+    }
+
+# answers for intput given in advance, per thread (watch mode runs without a console)
+_answers = local()
+
+def set_answers(answers: list | None):
+    _answers.values = list(answers) if answers is not None else None
+
 # input number with min, max and default value
 def intput(min=0, max=100, default=0, info: str = None):
+    answers = getattr(_answers, "values", None)
+    if answers is not None:
+        if not answers:
+            raise Exception(f"No answer given for: {info or 'number'}")
+        value = answers.pop(0)
+        num = default if value in ("", None) else to_int_default(value, None)
+        if num is None or not min <= num <= max:
+            raise Exception(f"Answer <{value}> must be between {min} and {max}")
+        return num
+
     while True:
         try:
             if info:
@@ -85,23 +273,55 @@ def to_float_default(s, default=0.0):
     except Exception:
         return default
 
+# ffprobe gives framerates as fraction string (e.g. 30000/1001)
+def to_fraction_default(s, default=Fraction(60)):
+    try:
+        value = Fraction(str(s))
+        return value if value > 0 else default
+    except Exception:
+        return default
+
 
 # ------------------------------------------------------------------
 # Functions for File Info
 # ------------------------------------------------------------------
 
+_probes = {} # also in memory, for processes which run longer (watch)
+
+# one ffprobe call for format, video and audio streams
+# the result is cached until size or mtime of the file change
+def probe(path: Path) -> dict:
+    stat = path.stat()
+    cache_key = str(path.resolve())
+    cached = _probes.get(cache_key) or get_cache(cache_key, namespace="probe")
+    if cached and cached.get("size") == stat.st_size and cached.get("mtime") == stat.st_mtime_ns:
+        _probes[cache_key] = cached
+        return cached["probe"]
+
+    ffprobe_path = is_app_installed("ffprobe", package_name="ffmpeg")
+    if ffprobe_path is None:
+        raise Exception("ffprobe not found")
+
+    cmd = [
+        ffprobe_path, "-v", "error",
+        "-show_format",
+        "-show_streams",
+        "-of", "json",
+        str(path)
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8", check=True)
+    data = json.loads(result.stdout)
+
+    cached = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "probe": data}
+    write_cache(cache_key, cached, namespace="probe")
+    if len(_probes) >= CACHE_LIMITS["probe"]:
+        _probes.clear()
+    _probes[cache_key] = cached
+    return data
+
 def get_audio_streams(filepath: str|Path) -> list[dict]:
     try:
-        cmd = [
-            "ffprobe", "-v", "error",
-            "-show_streams",
-            "-select_streams", "a",
-            "-of", "json",
-            str(filepath)
-        ]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        info = json.loads(result.stdout)
-        return info.get("streams", [])
+        return [s for s in probe(Path(filepath)).get("streams", []) if s.get("codec_type") == "audio"]
     except:
         return []
 
@@ -121,6 +341,8 @@ def get_file_info(path: Path):
         "is_image": False,
         "duration": None,
         "fps": None,
+        "frames": None,
+        "pix_fmt": None,
         "width": None,
         "height": None,
     }
@@ -128,6 +350,7 @@ def get_file_info(path: Path):
     if not info["is_file"]:
         return info
 
+    import mimetypes # only needed here, keeps the start fast
     mime, _ = mimetypes.guess_type(str(path))
     info["type"] = mime
 
@@ -135,75 +358,311 @@ def get_file_info(path: Path):
         info["is_image"] = True
     elif mime and mime.startswith("video"):
         try:
-            # ffprobe liefert Infos zu Auflösung & Dauer
-            cmd = [
-                ffprobe_path, "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height,r_frame_rate,duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                str(path)
-            ]
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            lines = result.stdout.strip().split("\n")
-            if len(lines) >= 4:
+            data = probe(path)
+            streams = data.get("streams", [])
+            video = next((s for s in streams if s.get("codec_type") == "video"), None)
+            if video is not None:
                 # Framerate kommt als Bruch (z.B. 30000/1001)
+                fps = video.get("r_frame_rate")
+                if to_fraction_default(fps, None) is None:
+                    fps = video.get("avg_frame_rate")
+                duration = to_float_default(video.get("duration"), default=0.0) or to_float_default(data.get("format", {}).get("duration"), default=0.0)
+
                 info["is_video"] = True
-                info["width"]  = to_int_default(lines[0], default=0)
-                info["height"] = to_int_default(lines[1], default=0)
-                info["fps"]    = lines[2]
-                info["duration"] = to_float_default(lines[3], default=0.0)
-            info["audio_streams"] = get_audio_streams(path)
+                info["width"]  = to_int_default(video.get("width"), default=0)
+                info["height"] = to_int_default(video.get("height"), default=0)
+                info["fps"]    = fps
+                info["duration"] = duration
+                info["pix_fmt"] = video.get("pix_fmt")
+                info["frames"] = to_int_default(video.get("nb_frames"), default=0) or round(duration * to_fraction_default(fps))
+                info["video_stream"] = video
+            info["format"] = data.get("format", {})
+            info["audio_streams"] = [s for s in streams if s.get("codec_type") == "audio"]
         except Exception:
             pass
 
     return info
 
+# probe many files at the same time
+def get_files_info(paths: list[Path]) -> list[dict]:
+    if len(paths) <= 1:
+        return [get_file_info(p) for p in paths]
+    get_file_info(paths[0]) # asks for installation only once, if ffprobe is missing
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+        return list(executor.map(get_file_info, paths))
+
+# no progress lines while several jobs are running at the same time
+_quiet = False
+
+def set_quiet(value: bool):
+    global _quiet
+    _quiet = value
+
+# progress lines of the threads of one job (e.g. decode, process and encode of run_chunked), per thread
+# run_command writes its line into the dict instead of printing it, the thread that waits for the job prints them together
+_progress = local()
+
+def set_progress_lines(lines: dict | None):
+    _progress.lines = lines
+
+def print_progress(lines: dict):
+    current = list(lines.values()) # the threads change the dict
+    if current and not _quiet:
+        print(" || ".join(current), " "*10, end="\r")
+
+# ------------------------------------------------------------------
+# Child processes
+#
+# ffmpeg, cugan and rife must not keep running (and block the GPU)
+# when a job fails, Ctrl+C is pressed or the console is closed
+# ------------------------------------------------------------------
+
+IS_WINDOWS = os.name == "nt"
+
+# all processes started by run_command (process -> thread id), so they can be stopped from another thread
+_running_processes = {}
+_running_lock = Lock()
+_job_object = None
+
+# windows: every child is put into a job object which is closed together with this process,
+# then windows kills all processes in it (also when the console window is closed)
+def _kill_on_close(proc):
+    global _job_object
+    if not IS_WINDOWS:
+        return
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class IO_COUNTERS(ctypes.Structure):
+            _fields_ = [(name, ctypes.c_ulonglong) for name in ("ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+                                                                 "ReadTransferCount", "WriteTransferCount", "OtherTransferCount")]
+
+        class JOBOBJECT_BASIC_LIMIT_INFORMATION(ctypes.Structure):
+            _fields_ = [("PerProcessUserTimeLimit", ctypes.c_int64), ("PerJobUserTimeLimit", ctypes.c_int64),
+                        ("LimitFlags", wintypes.DWORD), ("MinimumWorkingSetSize", ctypes.c_size_t),
+                        ("MaximumWorkingSetSize", ctypes.c_size_t), ("ActiveProcessLimit", wintypes.DWORD),
+                        ("Affinity", ctypes.c_size_t), ("PriorityClass", wintypes.DWORD), ("SchedulingClass", wintypes.DWORD)]
+
+        class JOBOBJECT_EXTENDED_LIMIT_INFORMATION(ctypes.Structure):
+            _fields_ = [("BasicLimitInformation", JOBOBJECT_BASIC_LIMIT_INFORMATION), ("IoInfo", IO_COUNTERS),
+                        ("ProcessMemoryLimit", ctypes.c_size_t), ("JobMemoryLimit", ctypes.c_size_t),
+                        ("PeakProcessMemoryUsed", ctypes.c_size_t), ("PeakJobMemoryUsed", ctypes.c_size_t)]
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+        kernel32.AssignProcessToJobObject.argtypes = [wintypes.HANDLE, wintypes.HANDLE]
+        with _running_lock:
+            if _job_object is None:
+                job = kernel32.CreateJobObjectW(None, None)
+                info = JOBOBJECT_EXTENDED_LIMIT_INFORMATION()
+                info.BasicLimitInformation.LimitFlags = 0x2000 # JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE
+                kernel32.SetInformationJobObject(wintypes.HANDLE(job), 9, ctypes.byref(info), ctypes.sizeof(info)) # 9 = extended limits
+                _job_object = job
+        kernel32.AssignProcessToJobObject(_job_object, int(proc._handle))
+    except Exception: # only a safety net, the processes are also killed by terminate_processes
+        pass
+
+# kill the process with all its children (e.g. cmd.exe -> ffmpeg with shell_flag)
+def kill_tree(proc):
+    if proc.poll() is not None:
+        return
+    try:
+        if IS_WINDOWS:
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL) # own process group, see run_command
+    except Exception:
+        pass
+    try:
+        proc.kill()
+    except Exception:
+        pass
+
+# thread_ids: only stop processes started by these threads, None stops all
+def terminate_processes(thread_ids=None):
+    with _running_lock:
+        processes = [proc for proc, owner in _running_processes.items() if thread_ids is None or owner in thread_ids]
+    for proc in processes:
+        kill_tree(proc)
+
+# also stop the children when python exits normally or the terminal is closed (linux)
+atexit.register(terminate_processes)
+if not IS_WINDOWS:
+    def _on_hangup(signum, frame):
+        terminate_processes()
+        raise SystemExit(1)
+    try:
+        signal.signal(signal.SIGHUP, _on_hangup)
+        signal.signal(signal.SIGTERM, _on_hangup)
+    except ValueError: # not the main thread
+        pass
+
+PROGRESS_LINE = compile(r'^(\w+)=\s*(\S*)$') # ffmpeg -progress prints key=value lines
+
+def format_time(seconds: float) -> str:
+    seconds = int(seconds)
+    h, m, s = seconds // 3600, seconds // 60 % 60, seconds % 60
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+# e.g. "upscale 120/500 frames | 12.3 frames/s | 0.51x | ETA 00:31"
+# fps: framerate of the video, for the speed compared to playback
+# skipped: frames done before (resumed job), they don't count for the speed
+def progress_line(name: str, done: int, total: int, seconds: float, fps=None, skipped: int = 0) -> str:
+    parts = [f"{name} {done}/{total} frames" if total else f"{name} {done} frames"]
+    rate = (done - skipped) / seconds if seconds > 0 else 0
+    if rate > 0:
+        parts.append(f"{rate:.1f} frames/s")
+        if fps:
+            parts.append(f"{rate / float(to_fraction_default(fps)):.2f}x")
+        if total > done:
+            parts.append(f"ETA {format_time((total - done) / rate)}")
+    return " | ".join(parts)
+
 # run a command and show progress
-def run_command(final_cmd, process_name="Process", shell_flag: bool = False):
+# total_frames, fps: for the ETA and the speed
+# watch: (folder, ext) counts the written frames of tools without progress output (cugan, rife),
+#        the frames must be numbered from 1 (00000001.png, ...)
+# timeout: max seconds for the command (Default: "timeouts" setting for this process_name)
+# the command is stopped if there is no new output or frame for "stall_timeout" seconds,
+# only for ffmpeg and watched frames, other tools (e.g. cugan on a batch of images) can be silent for a long time
+# returns {"seconds", "frames", "bytes"}
+def run_command(final_cmd, process_name="Process", shell_flag: bool = False,
+                total_frames: int = 0, fps=None, watch: tuple[Path, str] = None, timeout: float = None) -> dict:
     fps_pattern = compile(r'frame=\s*([\d.]+)') # regex to find "frame= 1234" in ffmpeg output
 
+    # ffmpeg writes the progress as key=value lines instead of one line with \r
+    is_ffmpeg = isinstance(final_cmd, list) and Path(final_cmd[0]).stem.lower() == "ffmpeg"
+    if is_ffmpeg:
+        final_cmd = [final_cmd[0], "-progress", "pipe:2", "-nostats"] + final_cmd[1:]
+
+    if timeout is None:
+        timeout = (get_setting("timeouts", {}) or {}).get(process_name)
+    stall_timeout = 0
+    if is_ffmpeg or watch is not None: # no progress is not a stall without a progress source
+        stall_timeout = to_float_default(get_setting("stall_timeout", 600), 0)
+
+    values = {} # last ffmpeg progress
+    last_line = [""] # for the error message
+    last_activity = [perf_counter()]
+
     proc = subprocess.Popen(
         final_cmd,
         stdout=subprocess.DEVNULL,
         stderr=subprocess.PIPE,
         text=True,
+        encoding="utf-8",
+        errors="replace", # e.g. japanese file names, a decode error would stop the reader thread
         bufsize=1,
-        shell=shell_flag
+        shell=shell_flag,
+        start_new_session=not IS_WINDOWS # own process group, so kill_tree gets the children too
     )
-
-    while True:
-        line = proc.stderr.readline()
-        if not line:
-            break
-
-        decoded = line.strip()
-
-        fps_match = fps_pattern.search(decoded)
-        if fps_match:
-            fps = int(fps_match.group(1))
-            print(f"{process_name} frame: {fps}", end="\r")
-        else:
-            print(f"{process_name}", end="\r")
-
-    proc.wait()
+    with _running_lock:
+        _running_processes[proc] = get_ident()
+    _kill_on_close(proc)
+
+    # read in a thread, so the progress is shown every 0.5 seconds and not in bursts
+    def read_output():
+        for line in proc.stderr:
+            last_activity[0] = perf_counter()
+            match = PROGRESS_LINE.match(line.strip())
+            if match:
+                values[match.group(1)] = match.group(2)
+                continue
+            fps_match = fps_pattern.search(line)
+            if fps_match:
+                values["frame"] = fps_match.group(1)
+            elif line.strip():
+                last_line[0] = line.strip()
+
+    # only checks for the next frames, listing a folder with thousands of frames every 0.5 seconds is slow
+    watched = FrameSequence(watch[0], watch[1]) if watch is not None else None
+    def frames_done() -> int:
+        if watched is not None:
+            while watched.path(watched.count + 1).exists():
+                watched.count += 1
+            return watched.count
+        return to_int_default(values.get("frame"), 0)
+
+    lines = getattr(_progress, "lines", None)
+    line_key = (process_name, get_ident())
+
+    start = perf_counter()
+    reader = Thread(target=read_output, daemon=True)
+    reader.start()
+    last_frames = 0
+    try:
+        while True:
+            try:
+                proc.wait(timeout=0.5)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            now = perf_counter()
+            frames = frames_done()
+            if frames != last_frames:
+                last_frames = frames
+                last_activity[0] = now
+            if timeout and now - start > timeout:
+                raise TimeoutError(f"{process_name} took longer than {timeout} seconds")
+            if stall_timeout and now - last_activity[0] > stall_timeout:
+                raise TimeoutError(f"{process_name} stopped, no progress for {stall_timeout:.0f} seconds")
+            line = progress_line(process_name, frames, total_frames, now - start, fps)
+            if lines is not None:
+                lines[line_key] = line
+            elif not _quiet:
+                print(line, " "*10, end="\r")
+        reader.join()
+    except BaseException:
+        kill_tree(proc) # e.g. Ctrl+C or timeout, don't leave the child running
+        raise
+    finally:
+        with _running_lock:
+            _running_processes.pop(proc, None)
+        if lines is not None:
+            lines.pop(line_key, None)
+
+    stats = {"seconds": perf_counter() - start, "frames": frames_done(), "bytes": to_int_default(values.get("total_size"), 0)}
+    if watch is not None:
+        stats["bytes"] = sum(f.stat().st_size for f in watch[0].glob(f"*.{watch[1]}"))
 
     if proc.returncode != 0:
-        raise Exception(f"{process_name} failed with code {proc.returncode}")
-    else:
+        raise Exception(f"{process_name} failed with code {proc.returncode}" + (f": {last_line[0]}" if last_line[0] else ""))
+    elif lines is None and not _quiet:
         print(f"{process_name} finished", " "*10)
+    return stats
 
 
 # ------------------------------------------------------------------
 # Check if external app is installed
 # ------------------------------------------------------------------
 
-def is_app_installed(name: str, already_tried: bool = False, package_name: str = None) -> str:
+# size and mtime of the executable, to notice when it was deleted or updated
+def app_identity(exe_path: str) -> dict:
+    full_path = which(exe_path) or exe_path
+    try:
+        stat = Path(full_path).stat()
+        return {"path": exe_path, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+    except OSError:
+        return {"path": exe_path, "size": None, "mtime": None}
+
+def is_valid_app(cached: dict) -> bool:
+    try:
+        return app_identity(cached["path"]) == cached and cached["size"] is not None
+    except Exception:
+        return False
+
+_app_paths = {} # name -> app_identity, found apps of this process
+
+# path of the app or None, never asks for an installation
+def find_app(name: str, package_name: str = None) -> str:
     if package_name is None:
         package_name = name
 
-    cached_path = get_cache(name) # check cache first
-    if cached_path:
-        return cached_path
+    cached_path = _app_paths.get(name) or get_cache(name, namespace="apps") # check cache first
+    if cached_path and is_valid_app(cached_path):
+        _app_paths[name] = cached_path
+        return cached_path["path"]
 
     exe_name = f"{name}.exe"
 
@@ -214,10 +673,20 @@ def is_app_installed(name: str, already_tried: bool = False, package_name: str =
         try:
             # Aufruf von cugan, -version gibt Info zurück
             subprocess.run([exe_path, "-version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            write_cache(name, exe_path) # cache path for next time
+            _app_paths[name] = app_identity(exe_path)
+            write_cache(name, _app_paths[name], namespace="apps") # cache path for next time
             return exe_path
         except (subprocess.CalledProcessError, FileNotFoundError):
             pass
+    return None
+
+def is_app_installed(name: str, already_tried: bool = False, package_name: str = None) -> str:
+    if package_name is None:
+        package_name = name
+
+    exe_path = find_app(name, package_name)
+    if exe_path is not None:
+        return exe_path
 
     # install from aesimp.com
 
@@ -241,10 +710,9 @@ def is_app_installed(name: str, already_tried: bool = False, package_name: str =
 
         print(f"Try installing {name}...")
         try:
-            zip_bytes = fetch_app_from_server(package_name)
-            extractZIP(zip_bytes)
-        except:
-            raise Exception(f"Error while installing <{name}>")
+            install_package(package_name)
+        except Exception as e:
+            raise Exception(f"Error while installing <{name}>: {e}")
 
         return is_app_installed(name, already_tried=True, package_name=package_name)
     return None
@@ -253,27 +721,136 @@ def is_app_installed(name: str, already_tried: bool = False, package_name: str =
 # ------------------------------------------------------------------
 # Server Connection
 # ------------------------------------------------------------------
-from urllib.request import Request, urlopen
-from urllib.parse import urlencode
 
-def fetch_app_from_server(zipname) -> bytes:
-    req = Request(
-        f"{SERVER_URL}/aesimp-tools/application/{zipname}",
-        headers={"Content-Type": "application/octet-stream"}
-    )
+# all apps which can be installed: app name -> package on the server
+PACKAGES = {"ffmpeg": "ffmpeg", "ffprobe": "ffmpeg", "cugan": "cugan", "rife-ncnn-vulkan": "rife-ncnn-vulkan"}
+DOWNLOAD_DIR = DEPENDENCIES_DIR / ".downloads" # unfinished downloads, continued next time
+DOWNLOAD_CHUNK = 1024 * 1024
+DOWNLOAD_RETRIES = 3
 
-    try:
-        # get zip file from server as bytes
-        with urlopen(req) as resp:
-            response_bytes = resp.read()
+_package_locks = {}
+_package_locks_lock = Lock()
+
+def get_server_url() -> str:
+    return str(get_setting("server_url", SERVER_URL)).rstrip("/")
+
+# list of all packages with size and sha256, e.g. {"ffmpeg": {"sha256": "...", "size": 1234}}
+def fetch_manifest() -> dict:
+    from urllib.request import Request, urlopen
+
+    cached = get_cache("manifest", namespace="downloads")
+    if cached is not None:
+        return cached
 
-        return response_bytes
+    req = Request(f"{get_server_url()}/aesimp-tools/application/manifest.json")
+    try:
+        with urlopen(req, timeout=30) as resp:
+            manifest = json.loads(resp.read().decode("utf-8"))
     except Exception as e:
-        raise Exception("Error while fetching app from server")
+        raise Exception(f"Error while fetching the download list: {e}")
+    write_cache("manifest", manifest, namespace="downloads", ttl=3600)
+    return manifest
+
+def file_sha256(path: Path) -> str:
+    from hashlib import sha256
+    h = sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(DOWNLOAD_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# download into a .part file, an interrupted download continues with a Range request
+def download_file(url: str, target: Path, expected_size: int = None, name: str = None):
+    from urllib.request import Request, urlopen
+
+    name = name or target.name
+    part = target.with_name(target.name + ".part")
+    part.parent.mkdir(parents=True, exist_ok=True)
+
+    for attempt in range(DOWNLOAD_RETRIES):
+        done = part.stat().st_size if part.exists() else 0
+        if expected_size and done >= expected_size:
+            break
+
+        req = Request(url, headers={"Range": f"bytes={done}-"} if done else {})
+        try:
+            with urlopen(req, timeout=30) as resp:
+                # 206: the server continues, 200: the server sends everything again
+                mode = "ab" if done and resp.status == 206 else "wb"
+                if mode == "wb":
+                    done = 0
+                total = to_int_default(resp.headers.get("Content-Length"), 0) + done
+                with part.open(mode) as f:
+                    while True:
+                        block = resp.read(DOWNLOAD_CHUNK)
+                        if not block:
+                            break
+                        f.write(block)
+                        done += len(block)
+                        if not _quiet:
+                            print(f"download {name}: {done / 1024**2:.1f} / {total / 1024**2:.1f} MB", end="\r")
+            if expected_size is None or done >= expected_size:
+                break
+        except Exception as e:
+            from urllib.error import HTTPError
+            if isinstance(e, HTTPError) and e.code == 416: # range not possible, start again
+                part.unlink(missing_ok=True)
+            elif attempt == DOWNLOAD_RETRIES - 1:
+                raise Exception(f"Download of <{name}> failed: {e}")
+            print(f"\ndownload {name} interrupted, try again...")
+    else:
+        raise Exception(f"Download of <{name}> failed")
+
+    part.replace(target)
+
+# download, verify and extract one package into DEPENDENCIES_DIR
+def install_package(package_name: str):
+    with _package_locks_lock: # the same package is never downloaded twice at the same time
+        lock = _package_locks.setdefault(package_name, Lock())
+    with lock:
+        verify = get_setting("verify_downloads", True)
+        try:
+            info = fetch_manifest().get(package_name)
+        except Exception:
+            if verify:
+                raise
+            info = None
+        if info is None and verify:
+            raise Exception(f"<{package_name}> is not in the download list")
+        info = info or {}
+
+        zip_path = DOWNLOAD_DIR / f"{package_name}.zip"
+        download_file(f"{get_server_url()}/aesimp-tools/application/{package_name}", zip_path, info.get("size"), package_name)
+
+        if info.get("sha256") and file_sha256(zip_path) != info["sha256"].lower():
+            zip_path.unlink(missing_ok=True)
+            raise Exception(f"Checksum of <{package_name}> is wrong, please try again")
+
+        extractZIP(zip_path)
+        zip_path.unlink(missing_ok=True)
+        print(f"<{package_name}> installed", " "*20)
 
 # can only install in DEPENDENCIES_DIR aesimp-tools/dependencies/
-def extractZIP(zip_bytes: bytes):
+# the zip is read from the disk, not from memory
+def extractZIP(zip_path: Path):
+    import zipfile
     DEPENDENCIES_DIR.mkdir(parents=True, exist_ok=True)
-    makedirs(str(DEPENDENCIES_DIR), exist_ok=True)
-    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+    root = DEPENDENCIES_DIR.resolve()
+    with zipfile.ZipFile(zip_path) as zf:
+        for member in zf.namelist(): # no files outside of DEPENDENCIES_DIR (e.g. "../../x.exe")
+            if not (root / member).resolve().is_relative_to(root):
+                raise Exception(f"Invalid file in zip <{member}>")
         zf.extractall(str(DEPENDENCIES_DIR))
+
+# download all missing apps at the same time
+def prefetch_apps() -> list[str]:
+    missing = sorted({package for name, package in PACKAGES.items() if find_app(name, package) is None})
+    if not missing:
+        return missing
+    set_quiet(len(missing) > 1) # progress lines would overwrite each other
+    try:
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            list(executor.map(install_package, missing))
+    finally:
+        set_quiet(False)
+    return missing
\ No newline at end of file
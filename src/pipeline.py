@@ -0,0 +1,667 @@
+from pathlib import Path
+from shutil import rmtree, copy2, disk_usage
+from os import link
+from hashlib import blake2b
+import subprocess
+import json
+from queue import Queue, Empty, Full
+from threading import Thread, Event, Lock, Semaphore, get_ident
+from concurrent.futures import ThreadPoolExecutor, wait
+from os import cpu_count
+from bisect import bisect_right
+from fractions import Fraction
+from re import compile
+from time import perf_counter
+from helper import get_setting, run_command, terminate_processes, to_fraction_default, progress_line, FrameSequence
+from helper import set_progress_lines, print_progress
+from helper import file_identity, get_cache, write_cache, delete_cache, probe, is_app_installed, to_float_default, to_int_default
+from timing import new_report, add_stage, save_report, dir_size
+
+
+# ------------------------------------------------------------------
+# Chunked frame pipeline
+#
+# decode N frames -> process (cugan, rife, ...) -> encode segment -> delete frames
+# at the end all segments are joined without reencoding
+# so the scratch space depends on the chunk size and not on the video length
+# ------------------------------------------------------------------
+
+# intermediate frames ("frame_format" setting)
+# ext: frames written by ffmpeg, args: ffmpeg settings for them
+# tool: format written by cugan / rife (-f), bpp: about bytes per pixel on the disk
+FRAME_FORMATS = {
+    "png": {"ext": "png", "args": [], "tool": "png", "bpp": 2.0},
+    "png-fast": {"ext": "png", "args": ["-compression_level", "0"], "tool": "png", "bpp": 3.1}, # no zlib compression
+    "bmp": {"ext": "bmp", "args": [], "tool": "png", "bpp": 3.0},
+    "webp": {"ext": "webp", "args": ["-lossless", "1", "-compression_level", "0"], "tool": "webp", "bpp": 1.5},
+}
+
+def get_frame_format() -> dict:
+    name = get_setting("frame_format", "png")
+    if name not in FRAME_FORMATS:
+        print(f"Unknown frame_format <{name}>, use png")
+        name = "png"
+    return FRAME_FORMATS[name]
+
+def frame_pattern(ext: str = "png") -> str:
+    return f"%08d.{ext}"
+
+# temp folder for the frames of a video, next to the video or in "scratch_dir" (e.g. a fast SSD or RAM disk)
+def get_work_dir(path: Path) -> Path:
+    scratch_dir = get_setting("scratch_dir")
+    if not scratch_dir:
+        return path.parent.joinpath(path.stem)
+    key = blake2b(str(path.resolve()).encode("utf-8"), digest_size=4).hexdigest()
+    return Path(scratch_dir) / f"{path.stem}-{key}"
+
+# frames per chunk, "chunk_frames" wins over "chunk_seconds"
+def get_chunk_size(fps) -> int:
+    chunk_frames = int(get_setting("chunk_frames", 0) or 0)
+    if chunk_frames > 0:
+        return chunk_frames
+
+    chunk_seconds = float(get_setting("chunk_seconds", 10) or 0)
+    if chunk_seconds <= 0:
+        return 0 # no chunks, whole video at once
+    return max(1, round(chunk_seconds * to_fraction_default(fps)))
+
+# chunks which can be on the disk at the same time:
+# decoding + waiting + processing + waiting + encoding, run_chunked never decodes more
+def chunks_in_flight(workers: int = 1) -> int:
+    queue_size = max(1, int(get_setting("pipeline_queue", 1) or 1))
+    return 2 + 2 * queue_size + workers
+
+# input frames which can be on the disk at the same time
+def frames_in_flight(chunk_size: int, overlap: int = 0, workers: int = 1, total_frames: int = 0) -> int:
+    frames = (chunk_size + overlap) * chunks_in_flight(workers) if chunk_size > 0 else total_frames
+    if total_frames:
+        frames = min(frames, total_frames)
+    return frames
+
+GB = 1024 ** 3
+
+# rough estimate of the scratch space, so a job stops before the disk is full and not after hours
+# frames_in_flight: input frames which can be on the disk at the same time
+# output_factor: size of the output frames of one input frame (e.g. 4 for 2x upscale)
+def check_scratch_space(work_dir: Path, width: int, height: int, frames_in_flight: int,
+                        frame_format: dict, output_factor: float = 1, extra_bytes: int = 0):
+    if not width or not height or not frames_in_flight:
+        return
+    out_bpp = FRAME_FORMATS["webp" if frame_format["tool"] == "webp" else "png"]["bpp"]
+    needed = width * height * frames_in_flight * (frame_format["bpp"] + output_factor * out_bpp) + extra_bytes
+
+    folder = work_dir
+    while not folder.exists() and folder != folder.parent:
+        folder = folder.parent
+    free = disk_usage(folder).free
+    if needed > free:
+        raise Exception(f"Not enough space in <{work_dir}>: about {needed / GB:.1f} GB needed, {free / GB:.1f} GB free")
+
+def reset_dir(path: Path):
+    if path.exists():
+        rmtree(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+def count_frames(path: Path, ext: str = "png") -> int:
+    return len(FrameSequence.scan(path, ext))
+
+# decode <count> frames beginning at frame <start> into folder
+def decode_chunk(ffmpeg_path, source: Path, fps, start: int, count: int, out_dir: Path, frame_format: dict) -> int:
+    cmd = [ffmpeg_path, "-y"]
+    if start > 0:
+        # accurate seek, ffmpeg decodes up to this frame
+        # half a frame earlier, so rounding never drops the first frame (the frame before is still earlier)
+        cmd += ["-ss", f"{float((start - Fraction(1, 2)) / to_fraction_default(fps)):.6f}"]
+    cmd += ["-i", str(source)]
+    if count > 0:
+        cmd += ["-frames:v", str(count)]
+    cmd += frame_format["args"] + [str(out_dir / frame_pattern(frame_format["ext"]))]
+    run_command(cmd, "decompose", total_frames=count, fps=fps)
+    return count_frames(out_dir, frame_format["ext"])
+
+# args: encoder settings, default "####" (intermediate file)
+def encode_segment(ffmpeg_path, frames_dir: Path, fps, segment: Path, ext: str = "png", args: list[str] = None):
+    cmd = [ffmpeg_path, "-y", "-framerate", str(fps), "-i", str(frames_dir / frame_pattern(ext))] + (args or ["####"]) + [str(segment)]
+    run_command(cmd, "encode", total_frames=count_frames(frames_dir, ext), fps=fps)
+
+# join segments with concat demuxer, audio is copied from the source if given
+# audio_args: e.g. encode the audio instead of copying it
+# duration: length of the video (frames / fps), the audio is cut there, the video is never cut
+def concat_segments(ffmpeg_path, segments: list[Path], target: Path, audio_source: Path = None, audio_args: list[str] = None,
+                    duration: float = None):
+    list_file = segments[0].parent / "segments.txt"
+    with list_file.open("w", encoding="utf-8") as f:
+        for segment in segments:
+            escaped = str(segment.resolve()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    cmd = [ffmpeg_path, "-y", "-f", "concat", "-safe", "0", "-i", str(list_file)]
+    if audio_source is not None:
+        cmd += ["-i", str(audio_source), "-map", "0:v", "-map", "1:a?"]
+    cmd += ["-c", "copy"] + (audio_args or [])
+    if audio_source is not None and duration:
+        cmd += ["-t", f"{duration:.6f}"]
+    cmd += [str(target)]
+    run_command(cmd, "concat")
+
+# ------------------------------------------------------------------
+# Duplicate frames
+#
+# anime is mostly animated on twos or threes, so many frames are equal
+# only unique frames are processed, the duplicates are linked afterwards
+# ------------------------------------------------------------------
+
+THUMB_SIZE = 32 # compare frames as small grayscale images
+
+def frame_path(folder: Path, num: int, ext: str = "png") -> Path:
+    return folder / (frame_pattern(ext) % num)
+
+def _thumbnails(ffmpeg_path, folder: Path, num_frames: int, ext: str) -> list[bytes] | None:
+    cmd = [
+        ffmpeg_path, "-v", "error",
+        "-i", str(folder / frame_pattern(ext)),
+        "-vf", f"scale={THUMB_SIZE}:{THUMB_SIZE},format=gray",
+        "-f", "rawvideo", "-"
+    ]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    except Exception:
+        return None
+    size = THUMB_SIZE * THUMB_SIZE
+    if len(result.stdout) != size * num_frames:
+        return None
+    return [result.stdout[i * size:(i + 1) * size] for i in range(num_frames)]
+
+# mean difference of two thumbnails (0 - 255)
+def _difference(a: bytes, b: bytes) -> float:
+    return sum(abs(x - y) for x, y in zip(a, b)) / len(a)
+
+# returns for every frame the number of the frame which has to be used instead
+# threshold > 0 also treats almost equal frames as duplicates
+def find_duplicates(ffmpeg_path, folder: Path, num_frames: int, threshold: float = 0, ext: str = "png") -> list[int]:
+    thumbnails = _thumbnails(ffmpeg_path, folder, num_frames, ext) if threshold > 0 else None
+
+    frame_map = []
+    hashes = {}
+    last_unique = None
+    for num in range(1, num_frames + 1):
+        digest = blake2b(frame_path(folder, num, ext).read_bytes(), digest_size=16).digest()
+        if digest in hashes: # exactly the same frame
+            frame_map.append(hashes[digest])
+            continue
+        if thumbnails and last_unique and _difference(thumbnails[num - 1], thumbnails[last_unique - 1]) <= threshold:
+            frame_map.append(last_unique)
+            continue
+        hashes[digest] = num
+        last_unique = num
+        frame_map.append(num)
+    return frame_map
+
+def link_or_copy(src: Path, dst: Path):
+    try:
+        link(src, dst)
+    except OSError:
+        copy2(src, dst)
+
+# like link_or_copy, but converts the frame if the format is different (e.g. bmp -> png)
+def copy_frame(ffmpeg_path, src: Path, dst: Path):
+    if src.suffix == dst.suffix:
+        link_or_copy(src, dst)
+    else:
+        subprocess.run([ffmpeg_path, "-v", "error", "-y", "-i", str(src), str(dst)], check=True)
+
+# process_dir(in_dir, out_dir) only gets the unique frames, out_dir gets the full sequence again
+def run_deduplicated(ffmpeg_path, in_dir: Path, out_dir: Path, num_frames: int, process_dir,
+                     in_ext: str = "png", out_ext: str = "png"):
+    if not get_setting("dedupe", True):
+        process_dir(in_dir, out_dir)
+        return
+
+    frame_map = find_duplicates(ffmpeg_path, in_dir, num_frames, float(get_setting("dedupe_threshold", 0) or 0), in_ext)
+    unique = sorted(set(frame_map))
+    print(f"{len(unique)} of {num_frames} frames are unique", " "*10)
+    if len(unique) == num_frames:
+        process_dir(in_dir, out_dir)
+        return
+
+    unique_in = in_dir.parent / "unique"
+    unique_out = in_dir.parent / "unique_processed"
+    reset_dir(unique_in)
+    reset_dir(unique_out)
+
+    new_num = {}
+    for i, num in enumerate(unique, start=1):
+        frame_path(in_dir, num, in_ext).rename(frame_path(unique_in, i, in_ext))
+        new_num[num] = i
+
+    process_dir(unique_in, unique_out)
+
+    # rebuild full sequence
+    for num, source_num in enumerate(frame_map, start=1):
+        link_or_copy(frame_path(unique_out, new_num[source_num], out_ext), frame_path(out_dir, num, out_ext))
+
+    rmtree(unique_in, ignore_errors=True)
+    rmtree(unique_out, ignore_errors=True)
+
+
+# ------------------------------------------------------------------
+# Scene cuts
+#
+# interpolating over a hard cut only creates morphing frames,
+# so the video is split into shots and the last frame of a shot is repeated instead
+# ------------------------------------------------------------------
+
+SHOWINFO_PTS = compile(r"Parsed_showinfo.*?\bpts:\s*(\d+)")
+
+# returns the first frame numbers of all new shots
+# setpts=N gives every frame its frame number as pts, so showinfo prints the frame number
+def detect_scene_cuts(ffmpeg_path, source: Path, threshold: float) -> list[int]:
+    if threshold <= 0:
+        return []
+
+    identity = file_identity(source)
+    cached = get_cache(identity["path"], namespace="scenes")
+    if cached and cached.get("input") == identity and cached.get("threshold") == threshold:
+        return cached["cuts"]
+
+    cmd = [
+        ffmpeg_path, "-hide_banner", "-i", str(source), "-an",
+        "-vf", f"scale=320:-2,setpts=N,select='gt(scene,{threshold})',showinfo",
+        "-f", "null", "-"
+    ]
+    print("detect scene cuts", end="\r")
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="replace")
+    if result.returncode != 0:
+        raise Exception(f"scene detection failed with code {result.returncode}")
+
+    cuts = sorted({int(m.group(1)) for m in SHOWINFO_PTS.finditer(result.stderr) if int(m.group(1)) > 0})
+    print(f"{len(cuts)} scene cuts found", " "*10)
+
+    write_cache(identity["path"], {"input": identity, "threshold": threshold, "cuts": cuts}, namespace="scenes")
+    return cuts
+
+
+# ------------------------------------------------------------------
+# Job manifest
+#
+# every finished segment is written to a manifest in the cache
+# if a job crashes, the next run with the same input and parameters continues after the last segment
+# ------------------------------------------------------------------
+
+def job_name(source: Path, target: Path, params: dict) -> str:
+    key = json.dumps([str(source.resolve()), str(target.resolve()), params], sort_keys=True)
+    return blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+# returns the finished chunks of an older run, if input and parameters are still the same
+def load_manifest(name: str, manifest: dict, segment_dir: Path) -> list[dict]:
+    old = get_cache(name, namespace="jobs")
+    if not old:
+        return []
+    if any(old.get(key) != manifest[key] for key in ("input", "params", "chunk_size", "overlap")):
+        return []
+
+    chunks = []
+    for chunk in old.get("chunks", []):
+        if chunk["segment"] and not (segment_dir / chunk["segment"]).is_file():
+            break
+        chunks.append(chunk)
+    return chunks
+
+def save_manifest(name: str, manifest: dict):
+    write_cache(name, manifest, namespace="jobs")
+
+def delete_manifest(name: str):
+    delete_cache(name, namespace="jobs")
+
+
+# queue helpers which give up when another stage failed
+def _put(q: Queue, item, cancel: Event):
+    while not cancel.is_set():
+        try:
+            q.put(item, timeout=0.2)
+            return True
+        except Full:
+            pass
+    return False
+
+def _acquire(slots: Semaphore, cancel: Event):
+    while not cancel.is_set():
+        if slots.acquire(timeout=0.2):
+            return True
+    return False
+
+def _get(q: Queue, cancel: Event):
+    while not cancel.is_set():
+        try:
+            return q.get(timeout=0.2)
+        except Empty:
+            pass
+    return None
+
+# process(in_dir, out_dir, chunk) has to write the frames for the encoder into out_dir
+#   chunk: {"index", "start", "frames", "next", "is_last", "cut"}
+#   is_last: end of the video, cut: the next chunk begins a new shot
+# overlap: frames which are decoded again in the next chunk (e.g. rife needs the next frame)
+# cuts: first frames of new shots, a chunk never goes over a cut (and has no overlap there)
+# workers: how many chunks are processed at the same time
+# params: everything which changes the result, a job is only resumed if they are the same
+# size, total_frames, output_factor: for the scratch space check (see check_scratch_space)
+# encode_args: encoder settings of the segments (Default: "####"), audio_args: e.g. encode the audio instead of copying it
+# the frames for process are in chunk["in_ext"] format, the output has to be chunk["out_ext"]
+# returns the timing report (see timing.py)
+#
+# decode, process and encode run at the same time in own threads:
+# while chunk k is processed, chunk k+1 is decoded and chunk k-1 is encoded
+# the queues between the stages are bounded, so only a few chunks are on the disk
+def run_chunked(ffmpeg_path, source: Path, fps, work_dir: Path, target: Path, process,
+                out_fps=None, overlap: int = 0, audio_source: Path = None, params: dict = None,
+                cuts: list[int] = None, workers: int = 1,
+                size: tuple[int, int] = (0, 0), total_frames: int = 0, output_factor: float = 1,
+                encode_args: list[str] = None, audio_args: list[str] = None):
+    chunk_size = get_chunk_size(fps)
+    out_fps = out_fps or fps
+    queue_size = max(1, int(get_setting("pipeline_queue", 1) or 1))
+    workers = max(1, workers)
+    cuts = sorted(cuts or [])
+    frame_format = get_frame_format()
+    in_ext, out_ext = frame_format["ext"], frame_format["tool"]
+
+    check_scratch_space(work_dir, size[0], size[1], frames_in_flight(chunk_size, overlap, workers, total_frames), frame_format, output_factor,
+                        extra_bytes=int(source.stat().st_size * output_factor)) # segments
+
+    segment_dir = work_dir / "segments"
+    segment_dir.mkdir(parents=True, exist_ok=True)
+
+    name = job_name(source, target, params or {})
+    manifest = {
+        "input": file_identity(source),
+        "params": params or {},
+        "target": str(target),
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "chunks": [],
+    }
+    manifest["chunks"] = load_manifest(name, manifest, segment_dir)
+    done = manifest["chunks"]
+    if done:
+        print(f"Resume after chunk {len(done)}")
+
+    report = new_report(target.stem, total_frames, fps, params)
+    resumed = done[-1]["next"] if done else 0
+    report["resumed_at_frame"] = resumed
+    report["pipeline"] = {"chunk_size": chunk_size, "overlap": overlap, "workers": workers}
+    job_start = perf_counter()
+
+    decoded = Queue(maxsize=queue_size)
+    processed = Queue(maxsize=queue_size)
+    cancel = Event()
+    errors = []
+    segments = [segment_dir / chunk["segment"] for chunk in done if chunk["segment"]]
+    thread_ids = set()
+    workers_left = [workers]
+    workers_lock = Lock()
+    # chunks on the disk, the encoder frees a slot when a chunk is done
+    # a slow chunk can't let the other workers run ahead (chunks wait in pending until it is encoded)
+    slots = Semaphore(chunks_in_flight(workers))
+    progress = {} # one progress line for all stages, printed by the waiting thread
+
+    def stage(func):
+        def run():
+            set_progress_lines(progress)
+            try:
+                func()
+            except BaseException as e:
+                errors.append(e)
+                cancel.set()
+                terminate_processes(thread_ids) # stop the other stages
+        return run
+
+    def decode_stage():
+        index = len(done)
+        start = done[-1]["next"] if done else 0
+        while _acquire(slots, cancel):
+            chunk_dir = work_dir / f"chunk{index:05d}"
+            in_dir = chunk_dir / "frames"
+            reset_dir(in_dir)
+
+            count = chunk_size + overlap if chunk_size > 0 else 0
+            next_start = start + chunk_size
+            next_cut = cuts[bisect_right(cuts, start)] if bisect_right(cuts, start) < len(cuts) else None
+            is_cut = next_cut is not None and (chunk_size == 0 or next_cut <= next_start)
+            if is_cut: # stop at the cut, no overlap into the next shot
+                count = next_cut - start
+                next_start = next_cut
+
+            t = perf_counter()
+            num_frames = decode_chunk(ffmpeg_path, source, fps, start, count, in_dir, frame_format)
+            add_stage(report, "decode", perf_counter() - t, num_frames, dir_size(in_dir, in_ext))
+            if num_frames == 0:
+                rmtree(chunk_dir, ignore_errors=True)
+                break
+            is_last = count == 0 or num_frames < count
+
+            chunk = {"index": index, "start": start, "frames": num_frames, "next": next_start,
+                     "is_last": is_last, "cut": is_cut and not is_last, "in_ext": in_ext, "out_ext": out_ext}
+            print(f"chunk {index + 1}: frames {start} - {start + num_frames - 1}", " "*10)
+            if not _put(decoded, (chunk_dir, chunk), cancel) or is_last:
+                break
+            start = next_start
+            index += 1
+        for _ in range(workers):
+            _put(decoded, None, cancel)
+
+    def process_stage():
+        while True:
+            item = _get(decoded, cancel)
+            if item is None:
+                break
+            chunk_dir, chunk = item
+            out_dir = chunk_dir / "processed"
+            reset_dir(out_dir)
+            t = perf_counter()
+            process(chunk_dir / "frames", out_dir, chunk)
+            add_stage(report, "process", perf_counter() - t, count_frames(out_dir, out_ext), dir_size(out_dir, out_ext))
+            rmtree(chunk_dir / "frames", ignore_errors=True)
+            if not _put(processed, item, cancel):
+                break
+        with workers_lock: # the last worker tells the encoder that everything is done
+            workers_left[0] -= 1
+            if workers_left[0] > 0:
+                return
+        _put(processed, None, cancel)
+
+    def encode_stage():
+        # chunks can be finished in a different order, the segments are encoded in the right order
+        pending = {}
+        next_index = len(done)
+        while True:
+            item = _get(processed, cancel)
+            if item is None:
+                break
+            pending[item[1]["index"]] = item
+            while next_index in pending:
+                chunk_dir, chunk = pending.pop(next_index)
+                segment = None
+                num_out = count_frames(chunk_dir / "processed", out_ext)
+                if num_out > 0: # e.g. less output than input frames
+                    segment = segment_dir / f"segment{next_index:05d}{target.suffix}"
+                    t = perf_counter()
+                    encode_segment(ffmpeg_path, chunk_dir / "processed", out_fps, segment, out_ext, encode_args)
+                    add_stage(report, "encode", perf_counter() - t, num_out, segment.stat().st_size)
+                    segments.append(segment)
+                rmtree(chunk_dir, ignore_errors=True)
+                slots.release()
+
+                chunk["segment"] = segment.name if segment else None
+                chunk["frames_out"] = num_out
+                done.append(chunk)
+                save_manifest(name, manifest)
+                next_index += 1
+
+                # progress of the whole video
+                frames_done = total_frames if chunk["is_last"] else chunk["next"]
+                print(progress_line("total", frames_done, total_frames, perf_counter() - job_start, fps, skipped=resumed), " "*10)
+
+    if not (done and done[-1]["is_last"]): # otherwise all chunks are already done
+        funcs = [decode_stage] + [process_stage] * workers + [encode_stage]
+        threads = [Thread(target=stage(func), daemon=True) for func in funcs]
+        for t in threads:
+            t.start()
+        thread_ids.update(t.ident for t in threads)
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=0.5)
+                    print_progress(progress)
+        except BaseException: # e.g. Ctrl+C
+            cancel.set()
+            terminate_processes(thread_ids)
+            raise
+
+    if errors:
+        raise errors[0]
+    if not segments:
+        raise Exception(f"No frames found in <{source}>")
+    t = perf_counter()
+    # older manifests don't know the output frames, then the audio may be a bit longer than the video
+    duration = None
+    if all("frames_out" in chunk for chunk in done):
+        duration = float(sum(chunk["frames_out"] for chunk in done) / to_fraction_default(out_fps))
+    concat_segments(ffmpeg_path, segments, target, audio_source, audio_args, duration=duration)
+    add_stage(report, "concat", perf_counter() - t, 0, target.stat().st_size)
+    delete_manifest(name)
+
+    report_file = save_report(report, perf_counter() - job_start)
+    if report_file is not None:
+        print(f"Timing report: {report_file}")
+    return report
+
+
+# ------------------------------------------------------------------
+# Segmented encoding
+#
+# x264/x265 don't use many cores well, so long videos are split at keyframes,
+# the parts are encoded at the same time with the same settings
+# and joined without reencoding
+# ------------------------------------------------------------------
+
+# pts of all video packets and of the keyframes (demuxing only, no decoding)
+def get_video_packets(source: Path) -> tuple[list[float], list[float]]:
+    ffprobe_path = is_app_installed("ffprobe", package_name="ffmpeg")
+    if ffprobe_path is None:
+        raise Exception("ffprobe not found")
+
+    cmd = [ffprobe_path, "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(source)]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, errors="replace")
+    if result.returncode != 0:
+        raise Exception(f"reading keyframes failed with code {result.returncode}")
+
+    pts, keyframes = [], []
+    for line in result.stdout.splitlines():
+        time, _, flags = line.partition(",")
+        t = to_float_default(time, None)
+        if t is None:
+            continue
+        pts.append(t)
+        if "K" in flags:
+            keyframes.append(t)
+    return sorted(pts), sorted(keyframes)
+
+# start times of the segments, every segment begins with a keyframe and is at least <seconds> long
+def plan_segments(keyframes: list[float], seconds: float) -> list[float]:
+    starts = []
+    for t in keyframes:
+        if not starts or t - starts[-1] >= seconds:
+            starts.append(t)
+    return starts
+
+def verify_encode(target: Path, duration: float, frames: int, fps, tolerance_frames: int):
+    video = next((s for s in probe(target).get("streams", []) if s.get("codec_type") == "video"), None)
+    if video is None:
+        raise Exception(f"No video in <{target.name}>")
+
+    # the encoder settings can change the framerate
+    out_fps = to_fraction_default(video.get("avg_frame_rate"), None) or to_fraction_default(fps)
+    expected = round(frames * out_fps / to_fraction_default(fps))
+    out_frames = to_int_default(video.get("nb_frames"), 0)
+    out_duration = to_float_default(video.get("duration"), 0) or to_float_default(probe(target).get("format", {}).get("duration"), 0)
+
+    # every frame is encoded once, only a new framerate rounds each part on its own
+    tolerance = 0 if out_fps == to_fraction_default(fps) else tolerance_frames
+    if out_frames and abs(out_frames - expected) > tolerance:
+        raise Exception(f"<{target.name}> has {out_frames} frames instead of {expected}")
+    if abs(out_duration - duration) > 0.1 + tolerance / float(out_fps):
+        raise Exception(f"<{target.name}> is {out_duration:.2f}s long instead of {duration:.2f}s")
+
+# the audio of the upload file (converter)
+UPLOAD_AUDIO_ARGS = ["-c:a", "aac", "-b:a", "320k"]
+
+# encode source with <args> (e.g. "####") into target
+# long videos are encoded in parts at the same time ("segment_seconds", "encode_workers" settings)
+def encode_video(ffmpeg_path, source: Path, target: Path, file_info: dict, args: list[str], process_name: str = "encode"):
+    seconds = to_float_default(get_setting("segment_seconds", 30), 0)
+    workers = to_int_default(get_setting("encode_workers", max(2, (cpu_count() or 1) // 4)), 1)
+    duration = file_info.get("duration") or 0
+
+    def encode_whole():
+        run_command([ffmpeg_path, "-y", "-i", str(source)] + args + [str(target)], process_name,
+                    total_frames=file_info.get("frames") or 0, fps=file_info.get("fps"))
+
+    if workers < 2 or seconds <= 0 or duration < 2 * seconds:
+        return encode_whole()
+
+    pts, keyframes = get_video_packets(source)
+    starts = plan_segments(keyframes, seconds)
+    if len(starts) < 2: # e.g. only one keyframe
+        return encode_whole()
+
+    fps = to_fraction_default(file_info.get("fps"))
+    half_frame = 0.5 / float(fps)
+    start_time = to_float_default(file_info.get("format", {}).get("start_time"), 0) # -ss is relative to it
+    ends = starts[1:] + [None]
+
+    work_dir = get_work_dir(source)
+    work_dir = work_dir.with_name(f"{work_dir.name}-encode")
+    reset_dir(work_dir)
+    segments = [work_dir / f"segment{i:05d}{target.suffix}" for i in range(len(starts))]
+    thread_ids = set()
+    progress = {}
+
+    # the part is cut on the input side (-ss/-to before -i), the encoder settings can change the framerate
+    # half a frame earlier than the first frame of the part and of the next part, so rounding never drops or repeats a frame
+    def encode_part(i):
+        thread_ids.add(get_ident())
+        set_progress_lines(progress)
+        begin = bisect_right(pts, starts[i] - half_frame) if i > 0 else 0
+        end = bisect_right(pts, ends[i] - half_frame) if ends[i] is not None else len(pts)
+        cmd = [ffmpeg_path, "-y"]
+        if i > 0:
+            cmd += ["-ss", f"{pts[begin] - start_time - half_frame:.6f}"]
+        if end < len(pts):
+            cmd += ["-to", f"{pts[end] - start_time - half_frame:.6f}"]
+        cmd += ["-i", str(source), "-an"] + args + [str(segments[i])]
+        run_command(cmd, f"{process_name} {i + 1}/{len(starts)}", total_frames=end - begin, fps=fps)
+
+    print(f"{process_name}: {len(starts)} parts, {min(workers, len(starts))} at the same time")
+    executor = ThreadPoolExecutor(max_workers=min(workers, len(starts)))
+    try:
+        try:
+            for future in [executor.submit(encode_part, i) for i in range(len(starts))]:
+                while not wait([future], timeout=0.5).done:
+                    print_progress(progress)
+                future.result()
+        except BaseException: # stop the other parts
+            executor.shutdown(wait=False, cancel_futures=True)
+            terminate_processes(thread_ids)
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+        # the parts have no audio, it is encoded once from the source
+        audio_source = source if file_info.get("audio_streams") else None
+        video_duration = float(len(pts) / fps)
+        concat_segments(ffmpeg_path, segments, target, audio_source, audio_args=UPLOAD_AUDIO_ARGS,
+                        duration=video_duration)
+        verify_encode(target, video_duration, len(pts), fps, tolerance_frames=len(starts))
+    finally:
+        rmtree(work_dir, ignore_errors=True)
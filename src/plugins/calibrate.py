@@ -0,0 +1,48 @@
+from pathlib import Path
+from shutil import rmtree
+from helper import is_app_installed, CACHE_DIR
+from pipeline import get_frame_format
+from tuning import calibrate, sample_frames, tuning_args
+from plugins.upscale import upscale_dir
+from plugins.interpolate import interpolate_folder
+
+SAMPLE_FRAMES = 8
+
+# measure the fastest settings for cugan and rife on this computer
+# a selected video is used as sample, else a generated test image
+def start(mode, params):
+    ffmpeg_path = is_app_installed("ffmpeg")
+    if ffmpeg_path is None:
+        raise Exception("ffmpeg not found")
+
+    tools = {"cugan": is_app_installed("cugan"), "rife": is_app_installed("rife-ncnn-vulkan")}
+    if not any(tools.values()):
+        raise Exception("Neither cugan nor rife-ncnn-vulkan found")
+
+    source = Path(params[0]) if params else None
+    frame_format = get_frame_format()
+    out_ext = frame_format["tool"]
+
+    work_dir = CACHE_DIR / "calibrate"
+    in_dir = work_dir / "in"
+    out_dir = work_dir / "out"
+    try:
+        frames = sample_frames(ffmpeg_path, in_dir, SAMPLE_FRAMES, frame_format, source)
+        if frames == 0:
+            raise Exception("No sample frames")
+
+        runs = {
+            "cugan": lambda i, o, args: upscale_dir(tools["cugan"], i, o, out_ext, tuning=args),
+            "rife": lambda i, o, args: interpolate_folder(tools["rife"], i, o, frames * 2, frames * 2, out_ext, tuning=args),
+        }
+        for name, exe_path in tools.items():
+            if exe_path is None:
+                print(f"<{name}> not found, skipped")
+                continue
+            print(f"\nCalibrate <{name}>...")
+            best = calibrate(name, exe_path, runs[name], in_dir, out_dir, frames)
+            print(f"Best for <{name}>: {' '.join(tuning_args(best))} ({best['fps']:.2f} frames/s)")
+    finally:
+        rmtree(work_dir, ignore_errors=True)
+
+    input("\nCalibration saved, press Enter to continue: ")
@@ -0,0 +1,131 @@
+from pathlib import Path
+from shutil import rmtree
+from functools import partial
+from helper import get_files_info, is_app_installed, get_setting
+from pipeline import run_chunked, get_work_dir, reset_dir, count_frames, UPLOAD_AUDIO_ARGS
+from scheduler import job, failed_job, run_jobs
+from plugins.upscale import upscale_chunk, get_upscale_params
+from plugins.interpolate import interpolate_chunk, get_rates, get_scene_cuts, ask_framerate
+from plugins.converter import get_encode_args
+
+# tools which can be combined, e.g. "upscale+interpolate+converter"
+# every chunk goes through all tools and is encoded only once at the end
+CHAIN_TOOLS = {"upscale": "upscaled", "interpolate": "flowframe", "converter": "upload"} # tool -> file name suffix
+
+def parse_chain(mode: str) -> list[str]:
+    tools = mode.split("+")
+    for tool in tools:
+        if tool not in CHAIN_TOOLS:
+            raise Exception(f"<{tool}> can't be combined, possible are: {', '.join(CHAIN_TOOLS)}")
+    if len(set(tools)) != len(tools):
+        raise Exception("Every tool can be used only once")
+    if "converter" in tools[:-1]:
+        raise Exception("converter has to be the last tool")
+    return tools
+
+# the frames of one chunk go from tool to tool, the next tool reads the output folder of the last one
+def chain_chunk(processes: list, in_dir: Path, out_dir: Path, chunk: dict):
+    stage_chunk = dict(chunk)
+    for i, process in enumerate(processes):
+        last = i == len(processes) - 1
+        stage_dir = out_dir if last else in_dir.parent / f"stage{i + 1}"
+        reset_dir(stage_dir)
+        process(in_dir, stage_dir, stage_chunk)
+        if i > 0:
+            rmtree(in_dir, ignore_errors=True)
+        in_dir = stage_dir
+        # between the tools the frames stay in the format of the tools, e.g. interpolate creates more frames
+        stage_chunk["in_ext"] = chunk["out_ext"]
+        stage_chunk["frames"] = count_frames(stage_dir, chunk["out_ext"])
+
+def get_target(tools: list[str], path: Path) -> Path:
+    # converter: the segments are written as upload file
+    if tools[-1] == "converter":
+        return path.parent.joinpath(f"{path.stem}-upload.mp4")
+    return path.parent.joinpath(f"{path.stem}-{'-'.join(CHAIN_TOOLS[t] for t in tools)}.mov")
+
+# everything which changes the result, for resuming (run_chunked) and the up to date check (start)
+def get_chain_params(tools: list[str], file_info: dict, factor: int, target_fps: int) -> dict:
+    params = {"mode": "+".join(tools)}
+    if "upscale" in tools:
+        params.update(get_upscale_params())
+    if "interpolate" in tools:
+        params.update({"factor": factor, "target_fps": target_fps, "scene_threshold": float(get_setting("scene_threshold", 0.3) or 0)})
+    if tools[-1] == "converter":
+        params["args"] = get_encode_args(file_info)
+    return params
+
+def chain_file(tools: list[str], path: Path, file_info: dict, ffmpeg_path, cugan_path, rife_path, factor: int, target_fps: int):
+    fps, out_fps, ratio = get_rates(file_info, factor, target_fps)
+    if "interpolate" not in tools:
+        out_fps = fps
+
+    processes = []
+    params = get_chain_params(tools, file_info, factor, target_fps)
+    output_factor = 1.0
+    overlap = 0
+    cuts = []
+    for tool in tools:
+        if tool == "upscale":
+            processes.append(partial(upscale_chunk, ffmpeg_path, cugan_path))
+            output_factor *= 4
+        elif tool == "interpolate":
+            processes.append(partial(interpolate_chunk, ffmpeg_path, rife_path, factor, ratio))
+            _, cuts = get_scene_cuts(ffmpeg_path, path)
+            output_factor *= float(out_fps / fps)
+            overlap = 1 # rife needs the first frame of the next chunk
+
+    # converter: the segments are encoded with the settings of the upload file
+    encode_args, audio_args = None, None
+    if tools[-1] == "converter":
+        encode_args, audio_args = params["args"], UPLOAD_AUDIO_ARGS
+
+    target_file = get_target(tools, path)
+    tmp_dir = get_work_dir(path)
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    report = run_chunked(ffmpeg_path, path, fps, tmp_dir, target_file, partial(chain_chunk, processes), out_fps=out_fps,
+                         overlap=overlap, audio_source=path, params=params, cuts=cuts,
+                         size=(file_info["width"], file_info["height"]), total_frames=file_info["frames"],
+                         output_factor=output_factor, encode_args=encode_args, audio_args=audio_args)
+
+    # if the job failed, the temp folder is kept, so the next run can continue
+    try:
+        rmtree(tmp_dir)
+    except Exception as e:
+        print("\nFolder not deleted!")
+        print(e)
+    return report
+
+def start(mode, params):
+    tools = parse_chain(mode)
+
+    ffmpeg_path = is_app_installed("ffmpeg")
+    if ffmpeg_path is None:
+        raise Exception("ffmpeg not found")
+
+    cugan_path = None
+    if "upscale" in tools:
+        cugan_path = is_app_installed("cugan")
+        if cugan_path is None:
+            raise Exception("cugan not found")
+
+    rife_path = None
+    factor, target_fps = None, None
+    if "interpolate" in tools:
+        rife_path = is_app_installed("rife-ncnn-vulkan")
+        if rife_path is None:
+            raise Exception("rife-ncnn-vulkan not found")
+        factor, target_fps = ask_framerate()
+
+    jobs = []
+    paths = [Path(p) for p in params]
+    for path, file_info in zip(paths, get_files_info(paths)):
+        if not file_info or not file_info.get("is_video"):
+            jobs.append(failed_job(path.name, "File must be a video"))
+            continue
+
+        jobs.append(job(path.name, partial(chain_file, tools, path, file_info, ffmpeg_path, cugan_path, rife_path, factor, target_fps), resource="gpu",
+                        inputs=[path], tools=[t for t in (ffmpeg_path, cugan_path, rife_path) if t], outputs=[get_target(tools, path)],
+                        params=get_chain_params(tools, file_info, factor, target_fps)))
+
+    run_jobs(jobs)
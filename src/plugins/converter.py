@@ -1,27 +1,39 @@
 from pathlib import Path
-from helper import get_file_info, is_app_installed, run_command
+from functools import partial
+from helper import get_files_info, is_app_installed
+from pipeline import encode_video
+from scheduler import job, run_jobs
+
+def get_target(path: Path) -> Path:
+    return path.parent.joinpath(f"{path.stem}-upload.mp4")
+
+# encoder settings for the upload file (also used by the chain, if converter is the last tool)
+def get_encode_args(file_info: dict) -> list[str]:
+    fps = file_info.get("fps", 60)
+
+    width = file_info.get("width")
+    height = file_info.get("height")
+
+    # ------ calculate ------
+    #
+    # Scale & Encode Settings
+    #
+    # ------ calculate end ------
+
+    return ["####"]
 
 def start(mode, params):
     ffmpeg_path = is_app_installed("ffmpeg") # get ffmpeg path
     if ffmpeg_path is None:
         raise Exception("ffmpeg not found")
 
-    for p in params:
-        path = Path(p)
-        file_info = get_file_info(path)
-
-        fps = file_info.get("fps", 60)
-
-        width = file_info.get("width")
-        height = file_info.get("height")
-
-        # ------ calculate ------
-        #
-        # Scale & Encode Settings
-        #
-        # ------ calculate end ------
+    jobs = []
+    paths = [Path(p) for p in params]
+    for path, file_info in zip(paths, get_files_info(paths)):
+        args = get_encode_args(file_info)
+        output_path = get_target(path)
 
-        output_path = path.parent.joinpath(f"{path.stem}-upload.mp4")
+        jobs.append(job(path.name, partial(encode_video, ffmpeg_path, path, output_path, file_info, args, "converter"),
+                        inputs=[path], tools=[ffmpeg_path], params={"mode": mode, "args": args}, outputs=[output_path]))
 
-        cmd = f'{ffmpeg_path} -y -i "{str(path)}" #### "{str(output_path)}"'
-        run_command(cmd)
\ No newline at end of file
+    run_jobs(jobs)
\ No newline at end of file
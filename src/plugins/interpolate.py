@@ -1,6 +1,160 @@
 from pathlib import Path
 from shutil import rmtree
-from helper import get_file_info, is_app_installed, run_command, extract_num, intput
+from functools import partial
+from fractions import Fraction
+from math import ceil, floor
+from helper import get_files_info, is_app_installed, run_command, intput, get_setting, to_fraction_default, FrameSequence
+from pipeline import run_chunked, detect_scene_cuts, link_or_copy, copy_frame
+from pipeline import get_work_dir, get_frame_format, frame_pattern
+from scheduler import job, run_jobs
+from tuning import get_tuning
+
+# run rife on a folder, only the first <keep> frames are kept
+# pick: numbers of the rife frames that are kept instead (in this order), see plan_frames
+# tuning: extra arguments (calibration), None = saved calibration
+def interpolate_folder(rife_path, path: Path, output_path: Path, num_out: int, keep: int, ext: str = "png", tuning: list[str] = None,
+                       pick: list[int] = None):
+    if tuning is None:
+        tuning = get_tuning("rife", rife_path)
+    rife_dir = output_path if pick is None else output_path / "rife"
+    rife_dir.mkdir(parents=True, exist_ok=True)
+    cmd = [rife_path, "-i", str(path), "-n", str(num_out), "####", "-o", str(rife_dir), "-f", frame_pattern(ext)] + tuning
+    run_command(cmd, "interpolate", total_frames=num_out, watch=(rife_dir, ext))
+
+    # rife writes 00000001 ... num_out
+    frames = FrameSequence(rife_dir, ext, count=num_out)
+    if pick is None: # delete the last generated frames to avoid duplicates
+        frames.trim(keep)
+        missing = frames.missing()
+    else:
+        missing = [num for num in pick if not frames.path(num).exists()]
+    if missing:
+        raise Exception(f"rife created no frame {missing[0]} in <{rife_dir}>")
+
+    if pick is not None:
+        kept = FrameSequence(output_path, ext, count=keep)
+        for num, source in enumerate(pick, start=1):
+            link_or_copy(frames.path(source), kept.path(num))
+        rmtree(rife_dir, ignore_errors=True)
+
+# how many frames rife has to create for a chunk, how many of them are kept
+# and how often the last input frame is repeated at the end (end of video or scene cut)
+# factor: every frame is multiplied, the first <keep> frames of rife are kept (pick is None)
+# ratio (source fps / target fps): output frame j shows source position j * ratio,
+#   so every chunk gets exactly the output frames whose position is inside the chunk
+#   rife spreads its frames evenly from the first frame of the chunk, so the frames nearest to the positions
+#   are picked, the positions are counted from the start of the video and don't jump at every chunk
+# if not is_last and not cut, the last input frame is the first frame of the next chunk
+def plan_frames(start: int, num_frames: int, is_last: bool, cut: bool = False,
+                factor: int = None, ratio: Fraction = None) -> tuple[int, int, int, list[int] | None]:
+    intervals = num_frames - 1
+    if factor:
+        hold = 0
+        if cut: # show the last frame of the shot as long as every other frame
+            hold = factor
+        elif is_last:
+            hold = 1
+        return num_frames * factor, intervals * factor, hold, None
+
+    before = ceil(start / ratio) # output frames of the chunks before
+    keep = ceil((start + intervals) / ratio) - before
+    # at least one rife frame per output frame, so no frame is picked twice
+    num_out = max(keep, ceil(num_frames / ratio)) if keep > 0 else 0
+    # rife frame j (from 0) shows the position j * num_frames / num_out of the chunk, round half up (no ties to even)
+    pick = [min(num_out - 1, floor(((before + k) * ratio - start) * num_out / num_frames + Fraction(1, 2))) + 1 for k in range(keep)]
+    hold = 0
+    if is_last or cut: # the last frame is shown until the end of the chunk
+        hold = ceil((start + num_frames) / ratio) - before - keep
+    return num_out, keep, hold, pick
+
+# framerate of the source and the output, ratio for plan_frames
+# factor: multiply frames, else target_fps: create exactly the frames for this framerate
+def get_rates(file_info: dict, factor: int, target_fps: int) -> tuple[Fraction, Fraction, Fraction]:
+    # folders have no framerate
+    fps = to_fraction_default(file_info.get("fps") if file_info["is_video"] else get_setting("folder_fps", 24))
+    out_fps = fps * factor if factor else Fraction(target_fps)
+    ratio = None if factor else fps / out_fps
+    return fps, out_fps, ratio
+
+# process function for run_chunked (use with partial)
+def interpolate_chunk(ffmpeg_path, rife_path, factor: int, ratio: Fraction, in_dir: Path, out_dir: Path, chunk: dict):
+    num_frames = chunk["frames"]
+    num_out, keep, hold, pick = plan_frames(chunk["start"], num_frames, chunk["is_last"], chunk["cut"], factor, ratio)
+    # chunk["sequence"]: input frames with other names (folders), else the frames of the chunk
+    frames_in = chunk.get("sequence") or FrameSequence(in_dir, chunk["in_ext"], count=num_frames)
+    frames_out = FrameSequence(out_dir, chunk["out_ext"], count=keep + hold)
+    if keep > 0:
+        interpolate_folder(rife_path, in_dir, out_dir, num_out, keep, frames_out.ext, pick=pick)
+    # no interpolation to the next shot, just repeat the last frame
+    if hold > 0:
+        copy_frame(ffmpeg_path, frames_in.path(num_frames), frames_out.path(keep + 1))
+    for num in range(keep + 2, keep + hold + 1):
+        link_or_copy(frames_out.path(keep + 1), frames_out.path(num))
+
+def get_scene_cuts(ffmpeg_path, path: Path) -> tuple[float, list[int]]:
+    scene_threshold = float(get_setting("scene_threshold", 0.3) or 0)
+    return scene_threshold, detect_scene_cuts(ffmpeg_path, path, scene_threshold)
+
+# ask once for all files, returns factor and target_fps
+def ask_framerate() -> tuple[int, int]:
+    target_fps = intput(min=0, max=240, default=60, info="Target framerate, the video keeps its length (0 = multiply the frames instead)")
+    factor = None
+    if target_fps == 0:
+        factor = intput(min=2, max=16, default=8, info="The quality can decrease by higher value")
+    return factor, target_fps
+
+def get_target(path: Path) -> Path:
+    return path.parent.joinpath(f"{path.stem}-flowframe.mov")
+
+# interpolate one video or folder, returns the timing report of a video
+def interpolate_file(mode, path: Path, file_info: dict, ffmpeg_path, rife_path, factor: int, target_fps: int):
+    tmp_dir = None
+    finished = False
+    fps, out_fps, ratio = get_rates(file_info, factor, target_fps)
+    process = partial(interpolate_chunk, ffmpeg_path, rife_path, factor, ratio)
+
+    try:
+        if file_info["is_video"]: # decompose, interpolate and encode in chunks
+            tmp_dir = get_work_dir(path)
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+
+            scene_threshold, cuts = get_scene_cuts(ffmpeg_path, path)
+
+            target_file = get_target(path)
+            job_params = {"mode": mode, "factor": factor, "target_fps": target_fps, "scene_threshold": scene_threshold}
+            report = run_chunked(ffmpeg_path, path, fps, tmp_dir, target_file, process, out_fps=out_fps, overlap=1,
+                                 params=job_params, cuts=cuts, workers=int(get_setting("rife_instances", 2) or 1),
+                                 size=(file_info["width"], file_info["height"]), total_frames=file_info["frames"],
+                                 output_factor=float(out_fps / fps))
+            finished = True
+            return report
+
+        # is image
+        if path.is_file():
+            raise Exception("Please select a video or folder")
+        elif path.is_dir():
+            output_path = path.joinpath("interpolate")
+            output_path.mkdir(parents=True, exist_ok=True)
+
+        # all .png Files (not recursive)
+        frames = FrameSequence.scan(path, "png")
+        out_ext = get_frame_format()["tool"]
+        process(path, output_path, {"start": 0, "frames": len(frames), "is_last": True, "cut": False,
+                                    "in_ext": "png", "out_ext": out_ext, "sequence": frames})
+
+        target_file = Path(file_info.get("path")).parent.joinpath(f"{file_info.get('filename')}-flowframe.mov")
+        cmd = f'{ffmpeg_path} -y -framerate {out_fps} -i "{str(output_path)}\%08d.{out_ext}" #### "{str(target_file)}"'
+        run_command(cmd, "encode")
+    finally:
+        # delete temp folder which is just for building frames
+        # if the job failed, it is kept, so the next run can continue
+        if file_info["is_video"]:
+            if tmp_dir is not None and finished:
+                try:
+                    rmtree(tmp_dir)
+                except Exception as e:
+                    print("\nFolder not deleted!")
+                    input("\nPress Enter to continue: ")
 
 def start(mode, params):
     ffmpeg_path = is_app_installed("ffmpeg")
@@ -11,55 +165,20 @@ def start(mode, params):
     if rife_path is None:
         raise Exception("rife-ncnn-vulkan not found")
 
-    factor = intput(min=2, max=16, default=8, info="The quality can decrease by higher value")
+    factor, target_fps = ask_framerate()
 
-    for p in params:
-        path = Path(p)
-        file_info = get_file_info(path)
+    jobs = []
+    paths = [Path(p) for p in params]
+    for path, file_info in zip(paths, get_files_info(paths)):
         if file_info is None:
             print(f"file info not found <{str(path)}>")
             input("Press Enter to continue: ")
             continue
 
-        tmp_dir = None
-        try:
-            if file_info["is_video"]: # decompose to folder
-                tmp_dir = path.parent.joinpath(path.stem)
-                tmp_dir.mkdir(parents=True, exist_ok=True)
-                run_command(fr'{ffmpeg_path} -i "{str(path)}" "{str(tmp_dir)}\%08d.png"', "decompose") # decompose
-                path = Path(tmp_dir)
-
-            # is image
-            if path.is_file():
-                raise Exception("Please select a video or folder")
-            elif path.is_dir():
-                output_path = path.joinpath("interpolate")
-                output_path.mkdir(parents=True, exist_ok=True)
-
-            # all .png Files (not recursive)
-            files = [f for f in path.glob("*.png")]
-            numFrames = len(files) * factor
-
-            cmd = f'{rife_path} -i "{str(path)}" -n {str(numFrames)} #### -o "{str(output_path)}"'
-            run_command(cmd, "interpolate")
-
-            n = factor - 1  # delete last generated frames to avoid duplicates
-            files = [f for f in output_path.glob("*.png")]
-            files_sorted = sorted(files, key=extract_num, reverse=True)
-            # delete n frames
-            for f in files_sorted[:n]:
-                f.unlink()
-
-
-            target_file = Path(file_info.get("path")).parent.joinpath(f"{file_info.get('filename')}-flowframe.mov")
-            cmd = f'{ffmpeg_path} -y -framerate 60 -i "{str(output_path)}\%08d.png" #### "{str(target_file)}"'
-            run_command(cmd, "encode")
-        finally:
-            # delete temp folder which is just for building frames
-            if file_info["is_video"]:
-                if tmp_dir is not None:
-                    try:
-                        rmtree(tmp_dir)
-                    except Exception as e:
-                        print("\nFolder not deleted!")
-                        input("\nPress Enter to continue: ")
\ No newline at end of file
+        up_to_date = {}
+        if file_info["is_video"]:
+            up_to_date = {"inputs": [path], "tools": [ffmpeg_path, rife_path], "outputs": [get_target(path)],
+                          "params": {"mode": mode, "factor": factor, "target_fps": target_fps, "scene_threshold": get_setting("scene_threshold", 0.3)}}
+        jobs.append(job(path.name, partial(interpolate_file, mode, path, file_info, ffmpeg_path, rife_path, factor, target_fps), resource="gpu", **up_to_date))
+
+    run_jobs(jobs)
\ No newline at end of file
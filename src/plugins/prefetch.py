@@ -0,0 +1,9 @@
+from helper import prefetch_apps
+
+# download all missing dependencies at the same time, e.g. before going offline
+def start(mode, params):
+    installed = prefetch_apps()
+    if installed:
+        print(f"Installed: {', '.join(installed)}")
+    else:
+        print("All dependencies are already installed")
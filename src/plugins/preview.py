@@ -0,0 +1,154 @@
+import json
+from pathlib import Path
+from functools import partial
+from time import perf_counter
+from helper import get_files_info, is_app_installed, run_command, get_setting, format_time, to_float_default, to_int_default
+from pipeline import frames_in_flight, reset_dir, encode_video, GB
+from scheduler import job, failed_job, run_jobs
+from timing import new_report, add_stage
+from plugins import converter, upscale, interpolate, chain
+
+# tools which can be previewed, chains like "upscale+interpolate" are possible too
+PREVIEW_TOOLS = ["upscale", "interpolate", "converter", "upscale+interpolate+converter"]
+MB = 1024 ** 2
+
+
+# ------------------------------------------------------------------
+# Preview
+#
+# a few short samples spread over the video go through the real tool,
+# the time per frame and the output size per second of the samples
+# are scaled up to the whole video, the sample outputs are kept to check the quality
+# ------------------------------------------------------------------
+
+# start and length of the samples, the whole video if it is too short
+def plan_samples(duration: float, count: int, seconds: float) -> list[tuple[float, float]]:
+    if count < 1 or seconds <= 0 or duration <= count * seconds:
+        return [(0.0, duration)]
+    return [(duration * (i + 1) / (count + 1) - seconds / 2, seconds) for i in range(count)]
+
+# the samples are copied without reencoding, so decoding costs the same as with the original
+# (they begin at the keyframe before <start>)
+def cut_sample(ffmpeg_path, source: Path, target: Path, start: float, seconds: float):
+    cmd = [ffmpeg_path, "-y", "-ss", f"{start:.3f}", "-i", str(source), "-t", f"{seconds:.3f}",
+           "-map", "0:v:0", "-map", "0:a?", "-c", "copy", "-avoid_negative_ts", "make_zero", str(target)]
+    run_command(cmd, "sample")
+
+# runs the tool on one sample, returns the timing report and the output file
+def run_sample(tools: list[str], sample: Path, file_info: dict, apps: dict, factor: int, target_fps: int) -> tuple[dict, Path]:
+    if tools == ["converter"]: # no chunks, the encoder is timed as a whole
+        target = converter.get_target(sample)
+        report = new_report(target.stem, file_info["frames"], file_info.get("fps"))
+        t = perf_counter()
+        encode_video(apps["ffmpeg"], sample, target, file_info, ["####"], "converter")
+        report["seconds"] = perf_counter() - t
+        add_stage(report, "encode", report["seconds"], file_info["frames"], target.stat().st_size)
+        return report, target
+    if tools == ["upscale"]:
+        report = upscale.upscale_file("upscale", sample, file_info, apps["ffmpeg"], apps["cugan"])
+        return report, upscale.get_target(sample)
+    if tools == ["interpolate"]:
+        report = interpolate.interpolate_file("interpolate", sample, file_info, apps["ffmpeg"], apps["rife"], factor, target_fps)
+        return report, interpolate.get_target(sample)
+    report = chain.chain_file(tools, sample, file_info, apps["ffmpeg"], apps["cugan"], apps["rife"], factor, target_fps)
+    return report, chain.get_target(tools, sample)
+
+# scale the measured samples up to the whole video
+def estimate(file_info: dict, samples: list[dict]) -> dict:
+    total_frames = file_info["frames"]
+    duration = file_info["duration"]
+    sample_frames = sum(s["frames"] for s in samples) or 1
+    sample_seconds = sum(s["duration"] for s in samples) or 1
+
+    per_frame = sum(s["report"]["seconds"] for s in samples) / sample_frames
+    output_bytes = sum(s["output_bytes"] for s in samples) / sample_seconds * duration
+
+    stages = {}
+    for s in samples:
+        for name, stage in s["report"]["stages"].items():
+            stages[name] = stages.get(name, 0) + stage["seconds"]
+
+    # frames on the disk at the same time + the encoded segments (see check_scratch_space)
+    scratch_bytes = 0
+    pipeline = samples[0]["report"].get("pipeline")
+    if pipeline:
+        decoded = sum(s["report"]["stages"].get("decode", {}).get("bytes", 0) for s in samples)
+        processed = sum(s["report"]["stages"].get("process", {}).get("bytes", 0) for s in samples)
+        per_input_frame = (decoded + processed) / sample_frames
+        scratch_bytes = frames_in_flight(total_frames=total_frames, **pipeline) * per_input_frame + output_bytes
+    else: # converter: the encoded parts of long videos before they are joined (see encode_video)
+        segment_seconds = to_float_default(get_setting("segment_seconds", 30), 0)
+        if segment_seconds > 0 and duration >= 2 * segment_seconds:
+            scratch_bytes = output_bytes
+
+    return {
+        "frames": total_frames,
+        "sample_frames": sample_frames,
+        "seconds_per_frame": per_frame,
+        "seconds": per_frame * total_frames,
+        "stages": {name: seconds / sample_frames * total_frames for name, seconds in stages.items()},
+        "output_bytes": output_bytes,
+        "scratch_bytes": scratch_bytes,
+    }
+
+def preview_file(tools: list[str], path: Path, file_info: dict, apps: dict, factor: int, target_fps: int):
+    preview_dir = path.parent.joinpath(f"{path.stem}-preview")
+    reset_dir(preview_dir)
+
+    count = to_int_default(get_setting("preview_samples", 3), 3)
+    seconds = to_float_default(get_setting("preview_seconds", 2), 2)
+    samples = []
+    for i, (start, length) in enumerate(plan_samples(file_info["duration"], count, seconds), start=1):
+        sample = preview_dir / f"{path.stem}-sample{i}{path.suffix}"
+        cut_sample(apps["ffmpeg"], path, sample, start, length)
+        sample_info = get_files_info([sample])[0]
+        if not sample_info or not sample_info.get("frames"):
+            raise Exception(f"sample {i} has no frames")
+
+        print(f"sample {i}: {format_time(start)} - {format_time(start + length)}", " "*10)
+        report, output = run_sample(tools, sample, sample_info, apps, factor, target_fps)
+        samples.append({"start": start, "duration": sample_info["duration"], "frames": sample_info["frames"],
+                        "output": output.name, "output_bytes": output.stat().st_size, "report": report})
+        sample.unlink(missing_ok=True) # only the outputs are kept
+
+    result = estimate(file_info, samples)
+    (preview_dir / "estimate.json").write_text(json.dumps({"tools": tools, **result, "samples": samples}, indent=4), encoding="utf-8")
+
+    print(f"\n<{path.name}> {'+'.join(tools)}: {len(samples)} samples, {result['sample_frames']} of {result['frames']} frames")
+    print(" "*4, f"time:    about {format_time(result['seconds'])} ({result['seconds_per_frame'] * 1000:.1f} ms per frame)")
+    for name, stage_seconds in result["stages"].items():
+        print(" "*8, f"{name:8} {format_time(stage_seconds)}")
+    print(" "*4, f"output:  about {result['output_bytes'] / MB:.0f} MB")
+    print(" "*4, f"scratch: about {result['scratch_bytes'] / GB:.1f} GB")
+    print(" "*4, f"samples: {preview_dir}")
+
+def start(mode, params):
+    from questionary import select # only needed here
+    tool = select("Which tool should be previewed?", choices=PREVIEW_TOOLS).ask()
+    if not tool:
+        return
+    tools = chain.parse_chain(tool)
+
+    apps = {"ffmpeg": is_app_installed("ffmpeg"), "cugan": None, "rife": None}
+    if apps["ffmpeg"] is None:
+        raise Exception("ffmpeg not found")
+    if "upscale" in tools:
+        apps["cugan"] = is_app_installed("cugan")
+        if apps["cugan"] is None:
+            raise Exception("cugan not found")
+    factor, target_fps = None, None
+    if "interpolate" in tools:
+        apps["rife"] = is_app_installed("rife-ncnn-vulkan")
+        if apps["rife"] is None:
+            raise Exception("rife-ncnn-vulkan not found")
+        factor, target_fps = interpolate.ask_framerate()
+
+    jobs = []
+    paths = [Path(p) for p in params]
+    for path, file_info in zip(paths, get_files_info(paths)):
+        if not file_info or not file_info.get("is_video") or not file_info.get("duration"):
+            jobs.append(failed_job(path.name, "File must be a video"))
+            continue
+        jobs.append(job(path.name, partial(preview_file, tools, path, file_info, apps, factor, target_fps), resource="gpu"))
+
+    run_jobs(jobs)
@@ -1,35 +1,119 @@
 from pathlib import Path
-from helper import get_file_info, is_app_installed, run_command, intput
+from functools import partial
+from helper import get_files_info, is_app_installed, run_command, intput, to_int_default
+from pipeline import encode_video
+from scheduler import job, failed_job, run_jobs
 
-def get_ffmpeg_audio_map_params(audio_streams: list[dict]) -> str:
+# tools which can be combined in multi, the file is read and decoded only once
+MULTI_TOOLS = ["remux", "decompose", "ripAudio", "compress", "downscale"]
+
+# codecs which can be copied into mp4 without reencoding
+MP4_VIDEO_CODECS = {"h264", "hevc", "av1", "vp9", "mpeg4"}
+MP4_AUDIO_CODECS = {"aac", "mp3", "ac3", "eac3", "alac", "opus"}
+JAPANESE = ("jpn", "japan", "japanese")
+# channel layouts with a front center channel (dialog)
+CENTER_LAYOUTS = {"3.0", "3.1", "4.0", "4.1", "5.0", "5.1", "6.0", "6.1", "7.0", "7.1", "hexagonal", "octagonal"}
+
+def score_audio_stream(stream: dict) -> tuple:
+    """
+    Japanese language or title wins, then the default track,
+    then the last track (same as before)
+    """
+    tags = stream.get("tags", {})
+    language = tags.get("language", "").lower()
+    title = tags.get("title", "").lower()
+    score = 0
+    if any(x in language for x in JAPANESE):
+        score += 100
+    if any(x in title for x in JAPANESE):
+        score += 50
+    if stream.get("disposition", {}).get("default"):
+        score += 10
+    return score, stream.get("index", 0)
+
+def get_remux_params(file_info: dict) -> list[str]:
     """
-    Get the audio parameters from FFprobe:
-    - If no or only one track -> map first track directly
-    - If multilingual -> select Japanese, if necessary extract Front-Center
+    Stream plan from the ffprobe data, ffmpeg runs only once:
+    - video: copy if mp4 can hold the codec, else encode
+    - audio: best track (see score_audio_stream), copy if possible
+      more than 2 channels -> Front-Center (dialog) or stereo downmix
+    all streams are mapped by their absolute index
     """
+    params = []
+    video = file_info.get("video_stream") or {}
+    params += ["-map", f"0:{video.get('index', 0)}"]
+    if video.get("codec_name") in MP4_VIDEO_CODECS:
+        params += ["-c:v", "copy"]
+        if video.get("codec_name") == "hevc":
+            params += ["-tag:v", "hvc1"] # else some players (and uploads) don't recognize it
+    else:
+        params += ["####"]
+
+    audio_streams = file_info.get("audio_streams", [])
     if not audio_streams:
-        return "-map 0:a:0"  # fallback: first Audio-track
-    
-    # Default: last track
-    selected_stream = audio_streams[-1]
-    
-    # Search for Japanese track
-    for stream in audio_streams:
-        tags = stream.get("tags", {})
-        language = tags.get("language", "").lower()
-        title = tags.get("title", "").lower()
-        if any(x in language for x in ["jpn", "japan", "japanese"]) or any(x in title for x in ["jpn", "japan", "japanese"]):
-            selected_stream = stream # found japanese stream
-            break
-    
+        return params # video only
+
+    selected_stream = max(audio_streams, key=score_audio_stream)
     stream_index = selected_stream.get("index", 0)
-    channels = selected_stream.get("channels", 2)
-    
-    if channels > 2:  # 5.1 track or more -> extract Front-Center
-        return f'-filter_complex "[0:a]pan=mono|c0=FC[a]" -map "[a]" -c:a aac'
+    channels = to_int_default(selected_stream.get("channels"), 2)
+    layout = (selected_stream.get("channel_layout") or "").split("(")[0]
+
+    if channels > 2 and layout in CENTER_LAYOUTS:  # 5.1 track or more -> extract Front-Center
+        params += ["-filter_complex", f"[0:{stream_index}]pan=mono|c0=FC[a]", "-map", "[a]", "-c:a", "aac"]
+    elif channels > 2:  # no center channel, mix down to stereo
+        params += ["-map", f"0:{stream_index}", "-ac", "2", "-c:a", "aac"]
+    elif selected_stream.get("codec_name") in MP4_AUDIO_CODECS:
+        params += ["-map", f"0:{stream_index}", "-c:a", "copy"]
     else:
-        # fallback: original track copy
-        return f'-map 0:a:{stream_index-1} -c copy'
+        params += ["-map", f"0:{stream_index}", "-c:a", "aac"]
+    return params
+
+# ffmpeg options and target of one tool, the input is always "-i path"
+def get_output(mode, path: Path, file_info: dict, crf=None) -> dict:
+    if mode == "remux":
+        output_path = path.parent.joinpath(f"{path.stem}-{mode}.mp4")
+        return {"args": get_remux_params(file_info), "target": output_path}
+    elif mode == "decompose":
+        output_path = path.parent.joinpath(path.stem)
+        output_path.mkdir(parents=True, exist_ok=True)
+        return {"args": [], "target": output_path / "%08d.png"}
+    elif mode == "ripAudio":
+        output_path = path.parent.joinpath(f"{path.stem}-{mode}.mp3")
+        return {"args": ["-q:a", "0", "-map", "a"], "target": output_path}
+    elif mode == "compress": # just use downscale with original size
+        fps = file_info.get("fps", 60)
+        output_path = path.parent.joinpath(f"{path.stem}-{mode}.mp4")
+
+        return {"args": ["####"], "target": output_path}
+    elif mode == "downscale":
+        fps = file_info.get("fps", 60)
+        width = file_info.get("width")
+        height = file_info.get("height")
+
+        text = "width" if width < height else "height"
+        scale = intput(min=360, max=2160, default=file_info.get(text), info=f"Please enter the target size for <{text}> (original: {file_info.get(text)}): ")
+
+        if scale is not None:
+            if width < height:
+                width_scale = scale
+                height_scale = int(round((height / width) * width_scale, 0))
+            else:
+                height_scale = scale
+                width_scale = int(round((width / height) * height_scale, 0))
+        else:
+            height_scale = height
+            width_scale = width
+
+        output_path = path.parent.joinpath(f"{path.stem}-{mode}.mp4")
+        return {"args": ["####"], "target": output_path, "params": {"width": width_scale, "height": height_scale}}
+    return None
+
+# one ffmpeg call for all outputs: the input is decoded once and every output gets its own -map / encoder
+def build_command(ffmpeg_path, path: Path, outputs: list[dict]) -> list[str]:
+    cmd = [ffmpeg_path, "-y", "-i", str(path)]
+    for output in outputs:
+        cmd += output["args"] + [str(output["target"])]
+    return cmd
 
 
 def start(mode, params):
@@ -37,59 +121,40 @@ def start(mode, params):
     if ffmpeg_path is None:
         raise Exception("ffmpeg not found")
 
-    for p in params:
-        path = Path(p)
-        file_info = get_file_info(path)
+    # multi: several tools at once for every file
+    modes = [mode]
+    if mode == "multi":
+        from questionary import checkbox # not needed for the other tools
+        modes = checkbox("Which files should be created?", choices=MULTI_TOOLS).ask() or []
+        if not modes:
+            return
+
+    # ask once for all files
+    crf = None
+    if any(m in ("compress", "downscale") for m in modes):
+        crf = intput(min=1, max=51, default=15, info="Lower is better quality but larger filesize")
 
-        cmd = None
-        shell_flag = False
+    jobs = []
+    paths = [Path(p) for p in params]
+    for path, file_info in zip(paths, get_files_info(paths)):
 
         if not file_info.get("is_video", False):
-            raise Exception("File must be a video")
-
-        if mode == "remux":
-            ffmpeg_params = get_ffmpeg_audio_map_params(file_info.get("audio_streams", []))
-
-            output_path = path.parent.joinpath(f"{path.stem}-{mode}.mp4")
-            cmd = f'{ffmpeg_path} -y -i "{str(path)}" -map 0:v {ffmpeg_params} #### "{str(output_path)}" 2>nul || {ffmpeg_path} -y -i "{str(path)}" #### "{str(output_path)}"'
-            shell_flag = True
-        elif mode == "decompose":
-            output_path = path.parent.joinpath(path.stem)
-            output_path.mkdir(parents=True, exist_ok=True)
-            cmd = fr'{ffmpeg_path} -y -i "{str(path)}" "{str(output_path)}\%08d.png"'
-        elif mode == "ripAudio":
-            output_path = path.parent.joinpath(f"{path.stem}-{mode}.mp3")
-            cmd = f'{ffmpeg_path} -y -i "{str(path)}" -q:a 0 -map a "{str(output_path)}"'
-        elif mode == "compress": # just use downscale with original size
-            crf = intput(min=1, max=51, default=15, info="Lower is better quality but larger filesize")
-            fps = file_info.get("fps", 60)
-            output_path = path.parent.joinpath(f"{path.stem}-{mode}.mp4")
-
-            cmd = f'{ffmpeg_path} -y -i "{str(path)}" #### "{str(output_path)}"'
-        elif mode == "downscale":
-            fps = file_info.get("fps", 60)
-            width = file_info.get("width")
-            height = file_info.get("height")
-
-            crf = intput(min=1, max=51, default=15, info="Lower is better quality but larger filesize")
-
-            text = "width" if width < height else "height"
-            scale = intput(min=360, max=2160, default=file_info.get(text), info=f"Please enter the target size for <{text}> (original: {file_info.get(text)}): ")
-
-            if scale is not None:
-                if width < height:
-                    width_scale = scale
-                    height_scale = int(round((height / width) * width_scale, 0))
-                else:
-                    height_scale = scale
-                    width_scale = int(round((width / height) * height_scale, 0))
-            else:
-                height_scale = height
-                width_scale = width
+            jobs.append(failed_job(path.name, "File must be a video"))
+            continue
 
-            output_path = path.parent.joinpath(f"{path.stem}-{mode}.mp4")
-            cmd = f'{ffmpeg_path} -y -i "{str(path)}" #### "{str(output_path)}"'
+        outputs = [get_output(m, path, file_info, crf) for m in modes]
+        outputs = [output for output in outputs if output is not None]
+
+        # decompose writes a folder, it is always done again
+        up_to_date = {}
+        if not any("%" in str(output["target"]) for output in outputs):
+            up_to_date = {"inputs": [path], "tools": [ffmpeg_path], "outputs": [output["target"] for output in outputs],
+                          "params": {"modes": modes, "crf": crf, "outputs": [[output["args"], output.get("params")] for output in outputs]}}
 
         # execute command
-        if cmd is not None:
-            run_command(cmd, process_name=mode, shell_flag=shell_flag)
\ No newline at end of file
+        if len(outputs) == 1 and modes[0] in ("compress", "downscale"): # long videos are encoded in parts
+            jobs.append(job(path.name, partial(encode_video, ffmpeg_path, path, outputs[0]["target"], file_info, outputs[0]["args"], mode), **up_to_date))
+        elif outputs:
+            jobs.append(job(path.name, partial(run_command, build_command(ffmpeg_path, path, outputs), process_name="+".join(modes)), **up_to_date))
+
+    run_jobs(jobs)
\ No newline at end of file
@@ -1,6 +1,116 @@
 from pathlib import Path
 from shutil import rmtree
-from helper import get_file_info, is_app_installed, run_command
+from functools import partial
+from helper import get_files_info, is_app_installed, run_command, get_setting
+from pipeline import run_chunked, run_deduplicated, get_work_dir, reset_dir, link_or_copy
+from scheduler import job, failed_job, run_jobs
+from tuning import get_tuning
+
+# upscale all frames of a folder, tuning: extra arguments (calibration), None = saved calibration
+# ext: format of the output (cugan writes <stem>.<ext>)
+# numbered: the input are frames 00000001 ..., so the progress can be counted in the output folder
+def upscale_dir(cugan_path, in_dir: Path, out_dir: Path, ext: str = "png", tuning: list[str] = None, numbered: bool = True):
+    if tuning is None:
+        tuning = get_tuning("cugan", cugan_path)
+    cmd = [cugan_path, "-i", str(in_dir), "-o", str(out_dir), "-s", "2", "-n", "3", "-m", "models-pro", "-f", ext]
+    run_command(cmd + tuning, "upscale", total_frames=sum(1 for _ in in_dir.iterdir()), watch=(out_dir, ext) if numbered else None)
+
+# formats cugan can write, everything else becomes png
+CUGAN_FORMATS = {".jpg": "jpg", ".jpeg": "jpg", ".png": "png", ".webp": "webp"}
+
+def upscaled_format(path: Path) -> str:
+    return CUGAN_FORMATS.get(path.suffix.lower(), "png")
+
+# name of the upscaled image in the "upscaled" folder
+def upscaled_name(path: Path) -> str:
+    return f"{path.stem}.{upscaled_format(path)}"
+
+# all images of one folder are upscaled by one cugan run per format, so the model is loaded only once or twice
+# they are linked into a staging folder next to the output (no copies), the results are moved to "upscaled"
+# only if every image was upscaled
+# two images must not have the same upscaled name (e.g. cover.png and cover.bmp), see start
+def upscale_images(cugan_path, paths: list[Path]):
+    output_dir = paths[0].parent.joinpath("upscaled")
+    names = [upscaled_name(path).lower() for path in paths]
+    if len(set(names)) != len(names):
+        raise Exception("Images with the same upscaled name: " + ", ".join(p.name for p, n in zip(paths, names) if names.count(n) > 1))
+    groups = {}
+    for path in paths:
+        groups.setdefault(upscaled_format(path), []).append(path)
+
+    stage_dirs = []
+    try:
+        results = {}
+        for ext, group in groups.items():
+            stage_in = output_dir / f".batch-{ext}"
+            stage_out = output_dir / f".batch-{ext}-upscaled"
+            stage_dirs += [stage_in, stage_out]
+            reset_dir(stage_in)
+            reset_dir(stage_out)
+            for path in group:
+                link_or_copy(path, stage_in / path.name)
+
+            upscale_dir(cugan_path, stage_in, stage_out, ext=ext, numbered=False)
+            for path in group:
+                results[path] = stage_out / upscaled_name(path)
+
+        missing = [path.name for path, result in results.items() if not result.exists()]
+        if missing:
+            raise Exception(f"Not upscaled: {', '.join(missing)}")
+        for path, result in results.items():
+            result.replace(output_dir / upscaled_name(path))
+    finally:
+        for folder in stage_dirs:
+            rmtree(folder, ignore_errors=True)
+
+# process function for run_chunked (use with partial), only unique frames are upscaled
+def upscale_chunk(ffmpeg_path, cugan_path, in_dir: Path, out_dir: Path, chunk: dict):
+    run_deduplicated(ffmpeg_path, in_dir, out_dir, chunk["frames"], partial(upscale_dir, cugan_path, ext=chunk["out_ext"]),
+                     chunk["in_ext"], chunk["out_ext"])
+
+def get_upscale_params() -> dict:
+    return {"scale": 2, "noise": 3, "model": "models-pro", "dedupe_threshold": get_setting("dedupe_threshold", 0)}
+
+def get_target(path: Path) -> Path:
+    return path.parent.joinpath(f"{path.stem}-upscaled.mov")
+
+# upscale one video, image or folder, returns the timing report of a video
+def upscale_file(mode, path: Path, file_info: dict, ffmpeg_path, cugan_path):
+    tmp_dir = None
+    finished = False
+    try:
+        if file_info["is_video"]: # decompose, upscale and encode in chunks
+            tmp_dir = get_work_dir(path)
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+
+            fps = file_info.get("fps", 60)
+            target_file = get_target(path)
+            job_params = {"mode": mode, **get_upscale_params()}
+            report = run_chunked(ffmpeg_path, path, fps, tmp_dir, target_file, partial(upscale_chunk, ffmpeg_path, cugan_path), audio_source=path, params=job_params,
+                                 size=(file_info["width"], file_info["height"]), total_frames=file_info["frames"], output_factor=4)
+            finished = True
+            return report
+
+        # is image
+        if path.is_file():
+            output_path = path.parent.joinpath("upscaled", path.name)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+        elif path.is_dir():
+            output_path = path.joinpath("upscaled")
+            output_path.mkdir(parents=True, exist_ok=True)
+
+        cmd = f'{cugan_path} -i "{str(path)}" -o "{str(output_path)}" -s 2 -n 3 -m models-pro {" ".join(get_tuning("cugan", cugan_path))} >NUL'
+        run_command(cmd, "upscale")
+    finally:
+        # if the job failed, the temp folder is kept, so the next run can continue
+        if file_info["is_video"]:
+            if tmp_dir is not None and finished:
+                try:
+                    rmtree(tmp_dir)
+                except Exception as e:
+                    print("\nFolder not deleted!")
+                    print(e)
+                    input("\nPress Enter to continue: ")
 
 def start(mode, params):
     ffmpeg_path = is_app_installed("ffmpeg")
@@ -15,44 +125,35 @@ def start(mode, params):
         input("Press Enter to continue: ")
         return
 
-    for p in params:
-        path = Path(p)
-        file_info = get_file_info(path)
+    jobs = []
+    images = {} # output folder -> images
+    paths = [Path(p) for p in params]
+    for path, file_info in zip(paths, get_files_info(paths)):
         if file_info is None:
             print("file info not found")
             input("Press Enter to continue: ")
             return
 
-        tmp_dir = None
-        try:
-            if file_info["is_video"]: # decompose to folder
-                tmp_dir = path.parent.joinpath(path.stem)
-                tmp_dir.mkdir(parents=True, exist_ok=True)
-                run_command(fr'{ffmpeg_path} -i "{str(path)}" "{str(tmp_dir)}\%08d.png"', "decompose") # decompose
-                path = Path(tmp_dir)
-
-            # is image
-            if path.is_file():
-                output_path = path.parent.joinpath("upscaled", path.name)
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-            elif path.is_dir():
-                output_path = path.joinpath("upscaled")
-                output_path.mkdir(parents=True, exist_ok=True)
-
-            cmd = f'{cugan_path} -i "{str(path)}" -o "{str(output_path)}" -s 2 -n 3 -m models-pro >NUL'
-            run_command(cmd, "upscale")
-
-            if file_info["is_video"]: # reencode / concat frames
-                fps = file_info.get("fps", 60)
-                target_file = Path(file_info.get("path")).parent.joinpath(f"{file_info.get('filename')}-upscaled.mov")
-                cmd = f'{ffmpeg_path} -y -framerate {fps} -i "{str(output_path)}\%08d.png" -i "{str(p)}" #### "{str(target_file)}"'
-                run_command(cmd, "encode")
-        finally:
-            if file_info["is_video"]:
-                if tmp_dir is not None:
-                    try:
-                        rmtree(tmp_dir)
-                    except Exception as e:
-                        print("\nFolder not deleted!")
-                        print(e)
-                        input("\nPress Enter to continue: ")
\ No newline at end of file
+        if file_info["is_image"]:
+            # cugan writes <stem>.<format>, e.g. cover.png and cover.bmp would both be cover.png
+            batch = images.setdefault(path.parent.joinpath("upscaled"), [])
+            same_name = next((p for p in batch if upscaled_name(p).lower() == upscaled_name(path).lower()), None)
+            if same_name is not None:
+                jobs.append(failed_job(path.name, f"<{same_name.name}> is also upscaled to <{upscaled_name(path)}>, please rename one of them"))
+                continue
+            batch.append(path)
+            continue
+
+        up_to_date = {}
+        if file_info["is_video"]:
+            up_to_date = {"inputs": [path], "tools": [ffmpeg_path, cugan_path], "outputs": [get_target(path)],
+                          "params": {"mode": mode, **get_upscale_params()}}
+        jobs.append(job(path.name, partial(upscale_file, mode, path, file_info, ffmpeg_path, cugan_path), resource="gpu", **up_to_date))
+
+    for output_dir, image_paths in images.items():
+        name = image_paths[0].name if len(image_paths) == 1 else f"{len(image_paths)} images in {output_dir.parent.name}"
+        jobs.append(job(name, partial(upscale_images, cugan_path, image_paths), resource="gpu",
+                        inputs=image_paths, tools=[cugan_path], params={"mode": mode, **get_upscale_params()},
+                        outputs=[output_dir / upscaled_name(p) for p in image_paths]))
+
+    run_jobs(jobs)
\ No newline at end of file
@@ -0,0 +1,211 @@
+import sys
+import json
+import sqlite3
+from os import scandir, devnull
+from pathlib import Path
+from time import time, sleep
+from threading import Thread, Lock
+from importlib import import_module
+from helper import INSTALL_DIR, get_setting, set_answers, is_app_installed, to_float_default, to_int_default
+from registry import find_plugin
+
+# modes which need a console (selection lists), the other modes get their answers from the settings
+NOT_WATCHABLE = {"multi", "preview", "calibrate", "prefetch", "watch"}
+# tools of a mode, resolved once at the start
+MODE_APPS = {"upscale": ["cugan"], "interpolate": ["rife-ncnn-vulkan"]}
+DONE_DIR = "processed" # files are moved into this subfolder, the outputs are written next to them
+QUEUE_DB = INSTALL_DIR / "watch.db"
+
+
+# ------------------------------------------------------------------
+# Watch folders
+#
+# runs until Ctrl+C: files dropped into a watch folder are queued
+# as soon as they are completely written (size doesn't change anymore)
+# and processed by the mode of the folder, one file per plugin call
+#
+# the queue is a SQLite file next to the settings, not in the cache:
+# after a restart, queued and interrupted files continue
+# (an interrupted upscale / interpolation continues after the last finished part)
+# ------------------------------------------------------------------
+
+_queue_lock = Lock()
+_queue_conn = None
+
+def _queue_db():
+    global _queue_conn
+    if _queue_conn is None:
+        QUEUE_DB.parent.mkdir(parents=True, exist_ok=True)
+        _queue_conn = sqlite3.connect(str(QUEUE_DB), timeout=30, check_same_thread=False)
+        _queue_conn.execute("PRAGMA journal_mode=WAL")
+        _queue_conn.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                answers TEXT NOT NULL,
+                state TEXT NOT NULL,
+                error TEXT,
+                added REAL NOT NULL,
+                finished REAL
+            )
+        """)
+    return _queue_conn
+
+def enqueue(path: Path, mode: str, answers: list):
+    with _queue_lock, _queue_db() as conn:
+        conn.execute("INSERT INTO queue (path, mode, answers, state, added) VALUES (?, ?, ?, 'queued', ?)",
+                     (str(path), mode, json.dumps(answers), time()))
+
+# oldest queued file, it is marked as running
+def next_job() -> dict | None:
+    with _queue_lock, _queue_db() as conn:
+        row = conn.execute("SELECT id, path, mode, answers FROM queue WHERE state = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE queue SET state = 'running' WHERE id = ?", (row[0],))
+    return {"id": row[0], "path": Path(row[1]), "mode": row[2], "answers": json.loads(row[3])}
+
+def finish_job(job_id: int, error: str = None):
+    with _queue_lock, _queue_db() as conn:
+        conn.execute("UPDATE queue SET state = ?, error = ?, finished = ? WHERE id = ?",
+                     ("failed" if error else "done", error, time(), job_id))
+
+# files which were running when the last watch stopped are started again
+def requeue_running() -> int:
+    with _queue_lock, _queue_db() as conn:
+        return conn.execute("UPDATE queue SET state = 'queued' WHERE state = 'running'").rowcount
+
+def count_queued() -> int:
+    with _queue_lock:
+        return _queue_db().execute("SELECT COUNT(*) FROM queue WHERE state = 'queued'").fetchone()[0]
+
+
+# checked watch folders from the settings, e.g.
+# "watch_folders": [{"folder": "D:\\in\\upscale", "mode": "upscale"}, {"folder": "D:\\in\\60fps", "mode": "interpolate", "answers": [60]}]
+def get_watch_folders() -> list[dict]:
+    folders = []
+    for entry in get_setting("watch_folders", []) or []:
+        folder, mode = Path(entry.get("folder", "")), entry.get("mode", "")
+        if mode in NOT_WATCHABLE or find_plugin(mode) is None:
+            raise Exception(f"<{mode}> can't be used in a watch folder")
+        if not folder.is_dir():
+            raise Exception(f"Watch folder <{folder}> not found")
+        folders.append({"folder": folder, "mode": mode, "answers": list(entry.get("answers", []))})
+    return folders
+
+# not finished copies and temp files of other programs
+def is_ignored(name: str) -> bool:
+    return name.startswith((".", "~")) or name.lower().endswith((".part", ".tmp", ".crdownload", ".partial"))
+
+# no overwriting if a file with the same name was sent before
+def free_path(path: Path) -> Path:
+    i = 2
+    target = path
+    while target.exists():
+        target = path.with_name(f"{path.stem} ({i}){path.suffix}")
+        i += 1
+    return target
+
+# files are ready if size and mtime didn't change for <stable_seconds>
+# seen: path -> (size, mtime, since), kept between the scans
+def scan_folder(watch: dict, seen: dict, stable_seconds: float) -> list[Path]:
+    ready = []
+    now = time()
+    with scandir(watch["folder"]) as entries:
+        for entry in entries:
+            if not entry.is_file() or is_ignored(entry.name):
+                continue
+            stat = entry.stat()
+            key = (stat.st_size, stat.st_mtime_ns)
+            path = Path(entry.path)
+            if path not in seen or seen[path][:2] != key:
+                seen[path] = (*key, now)
+            elif now - seen[path][2] >= stable_seconds:
+                ready.append(path)
+    for path in ready:
+        del seen[path]
+    return ready
+
+def run_job(j: dict):
+    plugin = find_plugin(j["mode"])
+    print(f"\nStart <{j['path'].name}> ({j['mode']})")
+    set_answers(j["answers"])
+    try:
+        import_module(plugin["module"]).start(j["mode"], [str(j["path"])])
+    finally:
+        set_answers(None)
+
+def worker(stop: list):
+    while not stop[0]:
+        j = next_job()
+        if j is None:
+            sleep(1)
+            continue
+        error = None
+        if not j["path"].exists():
+            error = "file not found"
+        else:
+            try:
+                run_job(j)
+            except Exception as e:
+                error = str(e)
+        finish_job(j["id"], error)
+        print(f"<{j['path'].name}> " + (f"FAILED ({error})" if error else "done"))
+
+def start(mode, params):
+    folders = get_watch_folders()
+    if not folders:
+        raise Exception("No watch folders, please add \"watch_folders\" to the settings")
+
+    # all tools are found (or installed) now, while somebody is at the console
+    apps = {"ffmpeg", "ffprobe"}
+    for watch in folders:
+        for tool in watch["mode"].split("+"):
+            apps.update(MODE_APPS.get(tool, []))
+    for app in sorted(apps):
+        if is_app_installed(app, package_name="ffmpeg" if app == "ffprobe" else None) is None:
+            raise Exception(f"{app} not found")
+
+    interval = to_float_default(get_setting("watch_interval", 5), 5)
+    stable_seconds = to_float_default(get_setting("watch_stable_seconds", 10), 10)
+    workers = max(1, to_int_default(get_setting("watch_workers", 1), 1))
+
+    restarted = requeue_running()
+    if restarted:
+        print(f"{restarted} interrupted files are started again")
+
+    # nobody answers questions anymore, a plugin which asks fails instead of waiting forever
+    sys.stdin = open(devnull)
+
+    stop = [False]
+    threads = [Thread(target=worker, args=(stop,), daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+
+    for watch in folders:
+        print(f"Watch <{watch['folder']}> -> {watch['mode']}")
+    print(f"{count_queued()} files in the queue, press Ctrl+C to stop")
+
+    seen = {}
+    try:
+        while True:
+            for watch in folders:
+                try:
+                    ready = scan_folder(watch, seen, stable_seconds)
+                except OSError: # e.g. network drive not reachable at the moment
+                    continue
+                for path in ready:
+                    target = free_path(watch["folder"] / DONE_DIR / path.name)
+                    target.parent.mkdir(exist_ok=True)
+                    try:
+                        path.rename(target)
+                    except OSError: # still opened by another program, try again later
+                        continue
+                    enqueue(target, watch["mode"], watch["answers"])
+                    print(f"Queued <{path.name}> ({watch['mode']})")
+            sleep(interval)
+    except KeyboardInterrupt: # running files are started again by the next watch
+        print("\nWatch stopped")
+    finally:
+        stop[0] = True
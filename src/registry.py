@@ -0,0 +1,38 @@
+# ------------------------------------------------------------------
+# Plugin registry
+#
+# mode name -> module, the module is only imported when the mode is used,
+# so every SendTo click only loads what it needs
+# shortcut: the mode can get a SendTo shortcut
+# ------------------------------------------------------------------
+
+PLUGINS = {}
+
+def register_plugin(name: str, module: str, shortcut: bool = True):
+    PLUGINS[name] = {"name": name, "module": module, "shortcut": shortcut}
+
+# greater tools have own files, small tools are in shortcut.py
+register_plugin("converter", "plugins.converter")
+register_plugin("upscale", "plugins.upscale")
+register_plugin("interpolate", "plugins.interpolate")
+register_plugin("calibrate", "plugins.calibrate")
+register_plugin("remux", "plugins.shortcut")
+register_plugin("decompose", "plugins.shortcut")
+register_plugin("ripAudio", "plugins.shortcut")
+register_plugin("downscale", "plugins.shortcut")
+register_plugin("multi", "plugins.shortcut") # several of the tools above in one go
+register_plugin("upscale+interpolate+converter", "plugins.chain") # tools combined with +, the video is encoded only once
+register_plugin("preview", "plugins.preview") # samples + time and size estimate of upscale, interpolate, converter
+register_plugin("prefetch", "plugins.prefetch", shortcut=False) # download all dependencies
+register_plugin("watch", "plugins.watch", shortcut=False) # process files dropped into folders (settings: watch_folders)
+
+# None if the mode doesn't exist, every combination with + goes to the chain
+def find_plugin(mode: str) -> dict | None:
+    if mode in PLUGINS:
+        return PLUGINS[mode]
+    if "+" in mode:
+        return {"name": mode, "module": "plugins.chain", "shortcut": False}
+    return None
+
+def shortcut_names() -> list[str]:
+    return sorted(name for name, plugin in PLUGINS.items() if plugin["shortcut"])
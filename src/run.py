@@ -1,10 +1,8 @@
 import sys
 from pathlib import Path
 from os import getenv
-from winshell import shortcut
 from importlib import import_module
-
-from questionary import Style, checkbox # for multiple choice
+from registry import find_plugin, shortcut_names
 
 SEND_TO_DIR = Path(getenv("APPDATA")) / "Microsoft" / "Windows" / "SendTo"
 INSTALL_DIR = Path(getenv("LocalAppData")) / "aesimp-tools"
@@ -12,18 +10,11 @@ IS_EXE = getattr(sys, 'frozen', False)
 
 TARGET_EXE = INSTALL_DIR / Path(sys.executable).name
 
-PLUGIN_LIST = {"converter", "upscale", "interpolate"}
-
-# create a new list that contains PLUGIN_LIST
-# all tools that can have a shortcut in SendTo
-SHORTCUT_LIST = PLUGIN_LIST.copy()
-SHORTCUT_LIST.add("remux")
-SHORTCUT_LIST.add("decompose")
-SHORTCUT_LIST.add("ripAudio")
-SHORTCUT_LIST.add("downscale")
-
+# winshell and questionary are only needed for the installation,
+# so they are imported there and not on every SendTo click
 
 def create_lnk(mode_name: str):
+    from winshell import shortcut
     lnk_file = SEND_TO_DIR / f"aesimp {mode_name}.lnk"
 
     # Shortcut mit Icon aus der eigenen Exe
@@ -35,6 +26,8 @@ def create_lnk(mode_name: str):
         link.icon_location = (str(INSTALL_DIR / exefile_name), 0)  # Icon aus der eigenen Exe
 
 def create_lnks():
+    from questionary import Style, checkbox # for multiple choice
+
     # delete old lnk
     for lnk in SEND_TO_DIR.rglob("aesimp*.lnk"): # delete all lnk
         lnk.unlink()
@@ -45,9 +38,7 @@ def create_lnks():
         ('pointer', 'fg:red bold')          # Pfeil
     ])
 
-    custom_list = SHORTCUT_LIST.copy()
-    custom_list.add("all of them")
-    custom_list = sorted(custom_list)
+    custom_list = sorted(shortcut_names() + ["all of them"])
 
     selected = checkbox(
         "Which tools will you use?",
@@ -56,7 +47,7 @@ def create_lnks():
     ).ask()
 
     if selected[0] == "all of them":
-        selected = SHORTCUT_LIST.copy()
+        selected = shortcut_names()
 
     for plugin in selected:
         create_lnk(plugin)
@@ -101,17 +92,15 @@ def main(args):
 
     try:
         # only import when exists
-        if mode not in SHORTCUT_LIST:
+        plugin = find_plugin(mode)
+        if plugin is None:
             print(f"No Module <{mode}> found")
             input("Press Enter to continue: ")
             return
 
-        # greater tools have own files
-        # small tools are in shortcut.py
-        im_module = mode if mode in PLUGIN_LIST else "shortcut"
-        m = import_module(f"plugins.{im_module}")
+        m = import_module(plugin["module"])
         if m is None:
-            raise Exception(f"Module <{im_module}> not found")
+            raise Exception(f"Module <{plugin['module']}> not found")
         m.start(mode, params)
     except Exception as e:
         print("An error occurred!")
@@ -0,0 +1,146 @@
+import json
+from pathlib import Path
+from hashlib import blake2b
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import BoundedSemaphore, Lock
+from time import perf_counter
+from helper import get_setting, set_quiet, terminate_processes, file_identity, app_identity, get_cache, write_cache
+
+
+# ------------------------------------------------------------------
+# Job scheduler
+#
+# plugins first collect all answers (intput) and build one job per file,
+# then the jobs run in parallel, limited per resource class:
+#   cpu: ffmpeg (remux, ripAudio, downscale, converter, ...)
+#   gpu: cugan / rife
+# ------------------------------------------------------------------
+
+DEFAULT_LIMITS = {"cpu": 2, "gpu": 1}
+
+def get_limit(resource: str) -> int:
+    return max(1, int(get_setting(f"{resource}_jobs", DEFAULT_LIMITS.get(resource, 1)) or 1))
+
+# one semaphore per resource for the whole process,
+# so the limits also hold if several plugins run at the same time (watch mode)
+_semaphores = {}
+_semaphores_lock = Lock()
+
+def get_semaphore(resource: str) -> BoundedSemaphore:
+    with _semaphores_lock:
+        if resource not in _semaphores:
+            _semaphores[resource] = BoundedSemaphore(get_limit(resource))
+        return _semaphores[resource]
+
+# inputs, tools, params: the job is skipped if it already ran with the same
+#   input files, tool versions and parameters and its outputs are unchanged
+def job(name: str, run, resource: str = "cpu", inputs: list[Path] = None, tools: list[str] = None,
+        params: dict = None, outputs: list[Path] = None) -> dict:
+    j = {"name": name, "run": run, "resource": resource}
+    if inputs and outputs:
+        j["fingerprint"] = {"inputs": inputs, "tools": tools or [], "params": params or {}}
+        j["outputs"] = outputs
+    return j
+
+# e.g. wrong file type, shows up in the summary like every other job
+def failed_job(name: str, error: str) -> dict:
+    def run():
+        raise Exception(error)
+    return job(name, run)
+
+# ------------------------------------------------------------------
+# Up to date check
+#
+# the fingerprint of a finished job is saved together with size and
+# mtime of its outputs, sending the same files again only runs new or changed ones
+# ------------------------------------------------------------------
+
+def get_fingerprint(spec: dict) -> str:
+    data = {
+        "inputs": [file_identity(Path(p)) for p in spec["inputs"]],
+        "tools": [app_identity(t) for t in spec["tools"]],
+        "params": spec["params"],
+    }
+    return blake2b(json.dumps(data, sort_keys=True, default=str).encode("utf-8"), digest_size=16).hexdigest()
+
+def output_identity(path: Path) -> dict | None:
+    try:
+        stat = Path(path).stat()
+        return {"path": str(Path(path).resolve()), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+    except OSError:
+        return None
+
+def is_up_to_date(j: dict, fingerprint: str) -> bool:
+    cached = get_cache(str(Path(j["outputs"][0]).resolve()), namespace="builds")
+    if not cached or cached.get("fingerprint") != fingerprint:
+        return False
+    return cached.get("outputs") == [output_identity(p) for p in j["outputs"]]
+
+def save_fingerprint(j: dict, fingerprint: str):
+    outputs = [output_identity(p) for p in j["outputs"]]
+    if None not in outputs:
+        write_cache(str(Path(j["outputs"][0]).resolve()), {"fingerprint": fingerprint, "outputs": outputs}, namespace="builds")
+
+
+# runs all jobs, prints a summary and raises if any job failed
+def run_jobs(jobs: list[dict]) -> list[dict]:
+    if not jobs:
+        return []
+
+    limits = {j["resource"]: get_limit(j["resource"]) for j in jobs}
+    semaphores = {resource: get_semaphore(resource) for resource in limits}
+    workers = min(len(jobs), sum(limits.values()))
+
+    # progress lines of several processes would overwrite each other
+    set_quiet(workers > 1)
+
+    results = []
+
+    skip = get_setting("skip_up_to_date", True)
+
+    def run(index, j):
+        with semaphores[j["resource"]]:
+            result = {"index": index, "name": j["name"], "ok": True, "error": None, "skipped": False}
+            start = perf_counter()
+            try:
+                fingerprint = get_fingerprint(j["fingerprint"]) if "fingerprint" in j else None
+                if skip and fingerprint and is_up_to_date(j, fingerprint):
+                    result["skipped"] = True
+                else:
+                    j["run"]()
+                    if fingerprint:
+                        save_fingerprint(j, fingerprint)
+            except Exception as e:
+                result.update(ok=False, error=str(e))
+            result["seconds"] = perf_counter() - start
+            return result
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(run, i, j) for i, j in enumerate(jobs)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            state = "up to date" if result["skipped"] else "done" if result["ok"] else f"FAILED ({result['error']})"
+            print(f"[{len(results)}/{len(jobs)}] {result['name']} {state}", " "*10)
+    except BaseException: # e.g. Ctrl+C, stop all running jobs
+        executor.shutdown(wait=False, cancel_futures=True)
+        terminate_processes()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        set_quiet(False)
+
+    results.sort(key=lambda r: r["index"])
+
+    failed = [r for r in results if not r["ok"]]
+    skipped = [r for r in results if r["skipped"]]
+    if len(jobs) > 1:
+        print(f"\n{len(jobs) - len(failed)} of {len(jobs)} files done" + (f", {len(skipped)} already up to date" if skipped else ""))
+        for r in results:
+            state = "skip  " if r["skipped"] else "ok    " if r["ok"] else "failed"
+            print(" "*4, state, r["name"], f"({r['seconds']:.1f}s)")
+
+    if failed:
+        raise Exception("\n".join(f"<{r['name']}> {r['error']}" for r in failed))
+    return results
@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+from datetime import datetime
+from threading import Lock
+from helper import INSTALL_DIR, get_setting, to_fraction_default
+
+
+# ------------------------------------------------------------------
+# Timing report
+#
+# run_chunked writes one report per job into REPORT_DIR
+# (wall time per stage, frames/s, bytes written),
+# so slower versions or settings can be compared
+# ------------------------------------------------------------------
+
+REPORT_DIR = INSTALL_DIR / "reports"
+MAX_REPORTS = 100 # older reports are deleted
+
+_report_lock = Lock()
+
+def dir_size(path: Path, ext: str = None) -> int:
+    files = path.glob(f"*.{ext}" if ext else "*")
+    return sum(f.stat().st_size for f in files if f.is_file())
+
+def new_report(name: str, total_frames: int = 0, fps=None, params: dict = None) -> dict:
+    return {
+        "name": name,
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "total_frames": total_frames,
+        "fps": float(to_fraction_default(fps)) if fps else None, # e.g. "24000/1001"
+        "params": params or {},
+        "stages": {},
+    }
+
+# stages run in own threads at the same time, so their seconds add up to more than the wall time
+def add_stage(report: dict, stage: str, seconds: float, frames: int = 0, bytes_written: int = 0):
+    with _report_lock:
+        s = report["stages"].setdefault(stage, {"runs": 0, "seconds": 0.0, "frames": 0, "bytes": 0})
+        s["runs"] += 1
+        s["seconds"] += seconds
+        s["frames"] += frames
+        s["bytes"] += bytes_written
+        s["frames_per_second"] = s["frames"] / s["seconds"] if s["seconds"] > 0 else None
+
+def save_report(report: dict, seconds: float) -> Path | None:
+    report["seconds"] = seconds
+    if not get_setting("timing_reports", True):
+        return None
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    file = REPORT_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{report['name']}.json"
+    file.write_text(json.dumps(report, indent=4), encoding="utf-8")
+
+    for old in sorted(REPORT_DIR.glob("*.json"))[:-MAX_REPORTS]:
+        old.unlink(missing_ok=True)
+    return file
@@ -0,0 +1,80 @@
+from pathlib import Path
+from time import perf_counter
+from helper import app_identity, get_cache, write_cache, get_setting, run_command
+from pipeline import reset_dir, count_frames, frame_pattern
+
+
+# ------------------------------------------------------------------
+# Tool tuning
+#
+# cugan and rife are much faster with a tile size (-t) and
+# load:proc:save threads (-j) that fit the graphics card.
+# the calibrate tool measures them once per tool version and device,
+# upscale and interpolate use the best one automatically
+# ------------------------------------------------------------------
+
+TILE_SIZES = {"cugan": [0, 128, 256, 512], "rife": [None]} # 0 = auto, rife has no tile size
+THREADS = ["1:2:2", "2:2:2", "2:4:4", "4:8:4"]
+
+# gpu_id setting: 0, 1, ... or -1 for the cpu, "auto" lets the tool decide
+def get_device() -> str:
+    return str(get_setting("gpu_id", "auto"))
+
+def device_args() -> list[str]:
+    device = get_device()
+    return [] if device == "auto" else ["-g", device]
+
+# a new version of the tool (other size or date) or another device needs a new calibration
+def tuning_key(name: str, exe_path: str) -> str:
+    app = app_identity(exe_path)
+    return f"{name}|{app['size']}|{app['mtime']}|{get_device()}"
+
+def tuning_args(config: dict) -> list[str]:
+    args = []
+    if config.get("tile") is not None:
+        args += ["-t", str(config["tile"])]
+    if config.get("threads"):
+        args += ["-j", config["threads"]]
+    return args
+
+# extra arguments for cugan / rife, the defaults of the tool if not calibrated
+def get_tuning(name: str, exe_path: str) -> list[str]:
+    best = get_cache(tuning_key(name, exe_path), namespace="calibration")
+    return device_args() + (tuning_args(best) if best else [])
+
+# frames for the benchmark: the first frames of a video or a generated test image
+def sample_frames(ffmpeg_path, out_dir: Path, count: int, frame_format: dict, source: Path = None) -> int:
+    reset_dir(out_dir)
+    cmd = [ffmpeg_path, "-y"]
+    if source is None:
+        cmd += ["-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=24"]
+    else:
+        cmd += ["-i", str(source)]
+    cmd += ["-frames:v", str(count)] + frame_format["args"] + [str(out_dir / frame_pattern(frame_format["ext"]))]
+    run_command(cmd, "sample")
+    return count_frames(out_dir, frame_format["ext"])
+
+# run(in_dir, out_dir, args) processes all frames of in_dir with the extra arguments,
+# every combination of tile size and threads is measured and the fastest is saved
+def calibrate(name: str, exe_path: str, run, in_dir: Path, out_dir: Path, frames: int) -> dict:
+    results = []
+    for tile in TILE_SIZES[name]:
+        for threads in THREADS:
+            config = {"tile": tile, "threads": threads}
+            reset_dir(out_dir)
+            start = perf_counter()
+            try:
+                run(in_dir, out_dir, device_args() + tuning_args(config))
+            except Exception as e: # e.g. tile too big for the memory of the graphics card
+                print(" "*4, f"{name} {' '.join(tuning_args(config))}: failed ({e})")
+                continue
+            config["fps"] = frames / (perf_counter() - start)
+            results.append(config)
+            print(" "*4, f"{name} {' '.join(tuning_args(config))}: {config['fps']:.2f} frames/s")
+
+    if not results:
+        raise Exception(f"<{name}> failed with every configuration")
+
+    best = max(results, key=lambda r: r["fps"])
+    write_cache(tuning_key(name, exe_path), {**best, "results": results}, namespace="calibration")
+    return best